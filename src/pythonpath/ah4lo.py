@@ -1,6 +1,7 @@
 import logging
 
 import lo_helper
+from ah4lo_cache import get_document_cache
 from ah4lo_dialogs import AH4LODialogs
 
 
@@ -14,11 +15,13 @@ class AH4LO:
     def run_calc(self):
         self._logger.debug("oDoc %s", self._oDoc.Title)
         lo_dialogs = AH4LODialogs(lo_helper.get_lang())
-        oDialogControl = lo_dialogs.create_calc_control(self._oDoc)
+        oDialogControl = lo_dialogs.create_calc_control(
+            self._oDoc, get_document_cache(self._oDoc))
         oDialogControl.setVisible(True)  # execute()
 
     def run_writer(self):
         self._logger.debug("oDoc %s", self._oDoc.Title)
         lo_dialogs = AH4LODialogs(lo_helper.get_lang())
-        oDialogControl = lo_dialogs.create_writer_control(self._oDoc)
+        oDialogControl = lo_dialogs.create_writer_control(
+            self._oDoc, get_document_cache(self._oDoc))
         oDialogControl.setVisible(True)  # execute()
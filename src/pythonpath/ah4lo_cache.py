@@ -0,0 +1,202 @@
+import logging
+from typing import Dict, List, Optional, Tuple, cast, Callable
+
+from ah4lo_search import ContentIndex
+from ah4lo_tree import Node, NodeBuilder, Loader
+from lo_helper import FormatTypeCache, ElementLocator
+from py4lo_helper import unohelper
+from py4lo_typing import UnoService
+
+try:
+    # noinspection PyUnresolvedReferences
+    from com.sun.star.util import XModifyListener
+except ImportError:
+    class XModifyListener:
+        pass
+
+
+class ModifyListener(unohelper.Base, XModifyListener):
+    """
+    A listener that calls back when the broadcaster is modified or disposed.
+    """
+
+    def __init__(self, on_modified: Callable[[], None],
+                 on_disposing: Callable[[], None]):
+        self.on_modified = on_modified
+        self.on_disposing = on_disposing
+
+    def modified(self, _e):
+        self.on_modified()
+
+    def disposing(self, _e):
+        self.on_disposing()
+
+
+class DocumentCache:
+    """
+    The tree and the analyses of a document, kept between two openings of
+    the dialog.
+
+    The children of a section (a sheet, the content of a Writer document)
+    are kept until the section is modified. The root is rebuilt if anything
+    was modified, but the sections that are still valid are reused. Some
+    modifications, like a new cell format, are reported by the document
+    only: they invalidate every section (see `validate`).
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self):
+        self.root = cast(Optional[Node], None)
+        # format keys do not change when the document is modified
+        self.format_types = cast(Optional[FormatTypeCache], None)
+        # the full-text index, filled in the background
+        self.content_index = ContentIndex()
+        # the elements of the Writer texts, by text frame name ("" for the
+        # body), dropped on any modification
+        self.locator_by_text = cast(Dict[str, ElementLocator], {})
+        self._children_by_section = cast(Dict[str, List[NodeBuilder]], {})
+        self._listener_by_section = cast(Dict[str, ModifyListener], {})
+        # modifications since the last call to `validate`
+        self._document_modified = False
+        self._section_modified = False
+        # incremented when a section is invalidated: a loader that ran
+        # meanwhile returns stale children
+        self._generation_by_section = cast(Dict[str, int], {})
+        self._generation = 0
+
+    def on_document_modified(self):
+        self.root = None
+        self.locator_by_text.clear()
+        self._document_modified = True
+
+    def invalidate(self, section: str):
+        """
+        Drop the children of the section and of its subsections, whose names
+        start with `section + "/"`.
+
+        :param section: the name of the section
+        """
+        self._logger.debug("Section %s is stale", section)
+        self.root = None
+        self._section_modified = True
+        self._generation_by_section[section] = (
+                self._generation_by_section.get(section, 0) + 1)
+        self._children_by_section.pop(section, None)
+        prefix = section + "/"
+        for name in [name for name in self._children_by_section
+                     if name.startswith(prefix)]:
+            del self._children_by_section[name]
+        self.content_index.evict(section)
+
+    def invalidate_all(self):
+        self.root = None
+        self._generation += 1
+        self._children_by_section.clear()
+        self.locator_by_text.clear()
+        self.content_index.clear()
+
+    def validate(self):
+        """
+        Called before the cache is used. The listeners of the document and
+        of the sections are not called in a known order, hence the
+        modifications are matched here: if the document was modified but
+        no section was, the modification is unknown and every section may
+        be stale.
+        """
+        if self._document_modified and not self._section_modified:
+            self._logger.debug("Unreported modification")
+            self.invalidate_all()
+        self._document_modified = False
+        self._section_modified = False
+
+    def cached_loader(self, section: str, loader: Loader) -> Loader:
+        """
+        :param section: the name of the section or of a subsection
+        :param loader: the loader of the section
+        :return: a loader that returns the cached children of the section,
+        or runs the loader and caches its result. The result is not cached
+        if the section was invalidated while the loader was running.
+        """
+        def cached() -> List[NodeBuilder]:
+            try:
+                return self._children_by_section[section]
+            except KeyError:
+                pass
+            generation = self._get_generation(section)
+            children = list(loader())
+            if self._get_generation(section) == generation:
+                self._children_by_section[section] = children
+            else:
+                self._logger.debug("Section %s changed while loading",
+                                   section)
+            return children
+
+        return cached
+
+    def _get_generation(self, section: str) -> Tuple[int, int]:
+        # a subsection is "<section>/<name>"
+        parent = section.split("/", 1)[0]
+        return self._generation, self._generation_by_section.get(parent, 0)
+
+    def watch(self, section: str, oBroadcaster: UnoService):
+        """
+        Invalidate the section when the broadcaster is modified.
+
+        :param section: the name of the section
+        :param oBroadcaster: an object that supports `XModifyBroadcaster`,
+        e.g. a sheet
+        """
+        if section in self._listener_by_section:
+            return
+
+        def on_disposing():
+            self._listener_by_section.pop(section, None)
+            self.invalidate(section)
+
+        listener = ModifyListener(lambda: self.invalidate(section),
+                                  on_disposing)
+        try:
+            oBroadcaster.addModifyListener(listener)
+        except Exception:
+            self._logger.exception("Watch %s", section)
+            return
+        self._listener_by_section[section] = listener
+
+
+_cache_by_document = cast(Dict[str, DocumentCache], {})
+
+
+def get_document_cache(oDoc: UnoService) -> DocumentCache:
+    """
+    :param oDoc: the document
+    :return: the cache of this document. The cache is created and bound to
+    the modifications of the document on first call.
+    """
+    key = _get_document_key(oDoc)
+    try:
+        cache = _cache_by_document[key]
+    except KeyError:
+        pass
+    else:
+        cache.validate()
+        return cache
+
+    cache = DocumentCache()
+    _cache_by_document[key] = cache
+
+    def on_disposing():
+        _cache_by_document.pop(key, None)
+
+    # a document-level change may be a new sheet or a new title: the
+    # sections decide by themselves if they are stale, unless none of them
+    # reports the change.
+    oDoc.addModifyListener(ModifyListener(cache.on_document_modified,
+                                          on_disposing))
+    return cache
+
+
+def _get_document_key(oDoc: UnoService) -> str:
+    try:
+        return oDoc.RuntimeUID
+    except AttributeError:
+        return oDoc.URL
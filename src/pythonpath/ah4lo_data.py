@@ -1,17 +1,213 @@
+import functools
 import logging
-from typing import Optional, cast, Dict, List, NewType
+from typing import (Optional, Dict, List, NewType, Any, Callable, Tuple,
+                    Iterable, cast)
 
+from ah4lo_cache import DocumentCache
 from ah4lo_lang import AH4LOLang
-from ah4lo_tree import Node, NodeBuilder, Action
-from lo_helper import guess_format_id, get_type_id, extract_values
+from ah4lo_search import Chunk, Section
+from ah4lo_tree import Node, NodeBuilder, Label, ActionDescriptor, Loader
+from lo_helper import (FormatTypeCache, extract_values, fetch_sample,
+                       guess_formats, sample_windows, coalesce_cells,
+                       format_range_addresses, shorten, get_text_prefix,
+                       LABEL_MAX_LENGTH, TITLE_MAX_LENGTH, KEY_MAX_LENGTH,
+                       Rectangle, column_name, ElementLocator)
 from py4lo_helper import get_used_range, to_iter
-from py4lo_typing import (UnoSpreadsheet, UnoRange, UnoSheet, UnoService,
-                          UnoController)
+from py4lo_typing import UnoSpreadsheet, UnoRange, UnoSheet, UnoService
+
+
+# number of nodes in a group
+CHUNK_SIZE = 10
+
+# a node and the 0-based indices of its first and last leaves
+_GroupItem = Tuple[NodeBuilder, int, int]
+
+
+class NodeGrouper:
+    """
+    Group a stream of nodes in a balanced tree: groups of `CHUNK_SIZE`
+    nodes, groups of `CHUNK_SIZE` groups, and so on, so that no node has more
+    than `CHUNK_SIZE` children. The labels of the groups are formatted when
+    they are displayed.
+    """
+
+    def __init__(self, label: Callable[[int, int], str], start: int = 0):
+        """
+        :param label: a function that returns the label of a group from its
+        first and last 1-based indices
+        :param start: the 0-based index of the first node
+        """
+        self._label = label
+        self._start = start
+        self._index = start
+        # the pending items of each level: nodes, groups of nodes, ...
+        self._levels = cast(List[List[_GroupItem]], [[]])
+
+    def append(self, node: NodeBuilder):
+        self._push(0, (node, self._index, self._index))
+        self._index += 1
+
+    def append_group(self, count: int) -> NodeBuilder:
+        """
+        Append a group of nodes that are created when the group is entered.
+        The nodes of a grouper are either appended one by one or by groups.
+
+        :param count: the number of nodes, at most `CHUNK_SIZE`
+        :return: the group node, whose loader must be set
+        """
+        first = self._index
+        last = first + count - 1
+        group_node = NodeBuilder(Label(self._label, first + 1, last + 1))
+        self._push(1, (group_node, first, last))
+        self._index += count
+        return group_node
+
+    def close(self) -> List[NodeBuilder]:
+        """
+        :return: the top groups, at most `CHUNK_SIZE`. The grouper is reset.
+        """
+        level = 0
+        while level < len(self._levels) - 1:
+            items = self._levels[level]
+            if items:
+                self._levels[level] = []
+                if level > 0 and len(items) == 1:
+                    self._push(level + 1, items[0])
+                else:
+                    self._push(level + 1, self._wrap(items))
+            level += 1
+
+        top_items = self._levels[-1]
+        if len(self._levels) == 1 and top_items:
+            top_items = [self._wrap(top_items)]
+        self._levels = [[]]
+        self._index = self._start
+        return [node for node, _, _ in top_items]
+
+    def _push(self, level: int, item: _GroupItem):
+        if level == len(self._levels):
+            self._levels.append([])
+        items = self._levels[level]
+        if len(items) == CHUNK_SIZE:
+            self._levels[level] = []
+            self._push(level + 1, self._wrap(items))
+            items = self._levels[level]
+        items.append(item)
+
+    def _wrap(self, items: List[_GroupItem]) -> _GroupItem:
+        first = items[0][1]
+        last = items[-1][2]
+        group_node = NodeBuilder(Label(self._label, first + 1, last + 1))
+        group_node.extend_children(node for node, _, _ in items)
+        return group_node, first, last
+
+
+def group_nodes(nodes: Iterable[NodeBuilder],
+                label: Callable[[int, int], str],
+                start: int = 0) -> List[NodeBuilder]:
+    """
+    :param nodes: the nodes
+    :param label: a function that returns the label of a group from its
+    first and last 1-based indices
+    :param start: the 0-based index of the first node
+    :return: the top groups, see `NodeGrouper`
+    """
+    grouper = NodeGrouper(label, start)
+    for node in nodes:
+        grouper.append(node)
+    return grouper.close()
 
 
 ##############################
 # CALC
 ##############################
+# number of columns analysed at once
+ANALYSED_COLUMN_COUNT = 100
+# below this share of matching cells, the type of a column is mixed
+MIN_FORMAT_CONFIDENCE = 0.8
+
+
+# action descriptors
+# (ACTIVATE_SHEET, sheet name)
+ACTIVATE_SHEET = "activate_sheet"
+# (SELECT_COLUMN, sheet name, column index)
+SELECT_COLUMN = "select_column"
+# (FOCUS_CONTROL, sheet name, form index, control index)
+FOCUS_CONTROL = "focus_control"
+# (GOTO_ELEMENT, text frame name or "", ordinal of the paragraph or table)
+GOTO_ELEMENT = "goto_element"
+
+
+class ActionResolver:
+    """
+    Execute an action descriptor against the document. The nodes hold the
+    descriptors rather than closures over UNO objects: the objects are
+    looked up only when an action is executed.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, oDoc: UnoService,
+                 cache: Optional[DocumentCache] = None):
+        """
+        :param oDoc: the document
+        :param cache: the cache of the document. If set, the elements of the
+        texts are located once until the document is modified. If not, they
+        are located once for the life of the resolver.
+        """
+        self.oDoc = oDoc
+        if cache is None:
+            self._locator_by_text = cast(Dict[str, ElementLocator], {})
+        else:
+            self._locator_by_text = cache.locator_by_text
+        self._execute_by_kind = {
+            ACTIVATE_SHEET: self._activate_sheet,
+            SELECT_COLUMN: self._select_column,
+            FOCUS_CONTROL: self._focus_control,
+            GOTO_ELEMENT: self._goto_element,
+        }
+
+    def __call__(self, descriptor: ActionDescriptor):
+        kind, *args = descriptor
+        self._execute_by_kind[kind](*args)
+
+    def _activate_sheet(self, sheet_name: str):
+        oController = self.oDoc.CurrentController
+        oController.ActiveSheet = self.oDoc.Sheets.getByName(sheet_name)
+
+    def _select_column(self, sheet_name: str, column: int):
+        oSheet = self.oDoc.Sheets.getByName(sheet_name)
+        self.oDoc.CurrentController.select(oSheet.Columns.getByIndex(column))
+
+    def _focus_control(self, sheet_name: str, form_index: int,
+                       control_index: int):
+        oController = self.oDoc.CurrentController
+        oSheet = self.oDoc.Sheets.getByName(sheet_name)
+        oController.ActiveSheet = oSheet
+        oControlModel = oSheet.DrawPage.Forms.getByIndex(
+            form_index).getByIndex(control_index)
+        oController.getControl(oControlModel).setFocus()
+
+    def _goto_element(self, frame_name: str, ordinal: int):
+        try:
+            locator = self._locator_by_text[frame_name]
+        except KeyError:
+            if frame_name:
+                oText = self.oDoc.TextFrames.getByName(frame_name).Text
+            else:
+                oText = self.oDoc.Text
+            locator = ElementLocator(oText)
+            self._locator_by_text[frame_name] = locator
+        oStart = locator.get_start(ordinal)
+        if oStart is None:
+            self._logger.warning("No element %s in %s", ordinal, frame_name)
+            return
+        self.oDoc.CurrentController.ViewCursor.gotoRange(oStart, False)
+
+
+def _format_annotation(ah4lo_lang: AH4LOLang, sheet_name: str, text: str,
+                       rectangles: List[Rectangle]) -> str:
+    return ah4lo_lang.annotation(
+        text, format_range_addresses(sheet_name, rectangles))
 
 
 class CalcDocumentNodeFactory:
@@ -19,108 +215,201 @@ class CalcDocumentNodeFactory:
     A factory to build the document tree
     """
 
-    def __init__(self, ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet):
+    def __init__(self, ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet,
+                 cache: Optional[DocumentCache] = None):
         self.ah4lo_lang = ah4lo_lang
         self.oDoc = oDoc
+        self.cache = cache
         self.oSheets = self.oDoc.Sheets
-        self.oController = self.oDoc.CurrentController
+        if cache is None:
+            self.format_types = FormatTypeCache(self.oDoc.NumberFormats)
+        else:
+            if cache.format_types is None:
+                cache.format_types = FormatTypeCache(self.oDoc.NumberFormats)
+            self.format_types = cache.format_types
 
     def get_root(self) -> Node:
-        root_node = NodeBuilder(self.ah4lo_lang.sheets(self.oSheets.Count))
+        if self.cache is not None and self.cache.root is not None:
+            return self.cache.root
+
+        root_node = NodeBuilder(
+            Label(self.ah4lo_lang.sheets, self.oSheets.Count))
         for i in range(self.oSheets.Count):
             oSheet = self.oSheets.getByIndex(i)
             sheet_node = SheetNodeFactory(self.ah4lo_lang, self.oDoc,
-                                          oSheet).get_root()
+                                          oSheet, self.format_types,
+                                          self.cache).get_root()
+            if self.cache is not None:
+                sheet_name = oSheet.Name
+                self.cache.watch(sheet_name, oSheet)
+                sheet_node.loader = self.cache.cached_loader(
+                    sheet_name, sheet_node.loader)
             root_node.append_child(sheet_node)
-        root_node.freeze_as_root()
-        return cast(Node, root_node)
+        root = root_node.freeze_as_root()
+        root.store.resolver = ActionResolver(self.oDoc, self.cache)
+        if self.cache is not None:
+            self.cache.root = root
+        return root
 
 
 class SheetNodeFactory:
     _logger = logging.getLogger(__name__)
 
     def __init__(self, ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet,
-                 oSheet: UnoSheet):
+                 oSheet: UnoSheet,
+                 format_types: Optional[FormatTypeCache] = None,
+                 cache: Optional[DocumentCache] = None):
         self.ah4lo_lang = ah4lo_lang
         self.oDoc = oDoc
         self.oSheet = oSheet
+        self.cache = cache
+        if format_types is None:
+            format_types = FormatTypeCache(self.oDoc.NumberFormats)
+        self.format_types = format_types
         self.oSheets = self.oDoc.Sheets
-        self.oController = self.oDoc.CurrentController
 
     def get_root(self) -> NodeBuilder:
-        def action(oController=self.oController,
-                   oSheet=self.oSheet):  # capture
-            oController.ActiveSheet = oSheet
-
+        """
+        :return: the sheet node. The content of the sheet is analysed when
+        the node is first entered.
+        """
         name = self._get_sheet_description()
-        sheet_node = NodeBuilder(name, action)
+        return NodeBuilder(name, (ACTIVATE_SHEET, self.oSheet.Name),
+                           self.get_children)
+
+    def get_children(self) -> List[NodeBuilder]:
+        children = []
         oRange = get_used_range(self.oSheet)
         range_address = oRange.RangeAddress
         column_count = range_address.EndColumn - range_address.StartColumn + 1
         row_count = range_address.EndRow - range_address.StartRow + 1
-        text = self.ah4lo_lang.used_range(column_count, row_count)
-        range_node = NodeBuilder(text)
-        sheet_node.append_child(range_node)
+        range_node = NodeBuilder(
+            Label(self.ah4lo_lang.used_range, column_count, row_count))
+        children.append(range_node)
         columns_node = self.get_columns(oRange)
-        sheet_node.append_child(columns_node)
+        children.append(columns_node)
 
         annotations_node = self.get_annotations()
         if annotations_node:
-            sheet_node.append_child(annotations_node)
+            children.append(annotations_node)
 
         dialogs_node = self.get_dialogs()
         if dialogs_node:
-            sheet_node.append_child(dialogs_node)
+            children.append(dialogs_node)
 
         charts_node = self.get_charts()
         if charts_node:
-            sheet_node.append_child(charts_node)
+            children.append(charts_node)
 
         data_pilot_tables_node = self.get_data_pilot_tables()
         if data_pilot_tables_node:
-            sheet_node.append_child(data_pilot_tables_node)
+            children.append(data_pilot_tables_node)
 
-        return sheet_node
+        return children
 
-    def _get_sheet_description(self):
+    def _get_sheet_description(self) -> Label:
         sheet_name = self.oSheet.Name
         is_hidden = not self.oSheet.IsVisible
         is_protected = self.oSheet.isProtected()
-        return self.ah4lo_lang.sheet_description(
-            sheet_name, is_hidden, is_protected)
+        return Label(self.ah4lo_lang.sheet_description,
+                     sheet_name, is_hidden, is_protected)
 
     def get_columns(self, oRange: UnoRange) -> NodeBuilder:
+        """
+        :return: the columns node. The columns are analysed when the node,
+        or the bucket that contains them, is first entered.
+        """
+        range_address = oRange.RangeAddress
+        column_count = range_address.EndColumn - range_address.StartColumn + 1
+        return NodeBuilder(
+            Label(self.ah4lo_lang.columns, column_count), None,
+            self._get_bucket_loader(oRange, 0, column_count))
+
+    def _get_bucket_loader(self, oRange: UnoRange, start: int, end: int
+                           ) -> Loader:
+        loader = functools.partial(self._get_column_buckets, oRange, start,
+                                   end)
+        if self.cache is not None:
+            # a sheet name never contains a slash: the bucket is dropped
+            # with the sheet section, see `DocumentCache.invalidate`
+            loader = self.cache.cached_loader(
+                "{}/{}:{}".format(self.oSheet.Name, start, end), loader)
+        return loader
+
+    def _get_column_buckets(self, oRange: UnoRange, start: int, end: int
+                            ) -> List[NodeBuilder]:
+        """
+        :return: the nodes of the columns `start` to `end` (excluded): the
+        columns themselves if they are few, groups of ten columns if they fit
+        in one analysis, buckets of 100, 1000, ... lazy columns otherwise.
+        """
+        count = end - start
+        if count <= ANALYSED_COLUMN_COUNT:
+            nodes = self._get_column_nodes(oRange, start, end)
+            if count <= CHUNK_SIZE:
+                return nodes
+            return group_nodes(nodes, self.ah4lo_lang.columns_range, start)
+
+        size = ANALYSED_COLUMN_COUNT
+        while size * CHUNK_SIZE < count:
+            size *= CHUNK_SIZE
+        return [
+            NodeBuilder(
+                Label(self.ah4lo_lang.columns_range,
+                      bucket_start + 1, min(bucket_start + size, end)),
+                None,
+                self._get_bucket_loader(oRange, bucket_start,
+                                        min(bucket_start + size, end)))
+            for bucket_start in range(start, end, size)
+        ]
+
+    def _get_column_nodes(self, oRange: UnoRange, start: int, end: int
+                          ) -> List[NodeBuilder]:
+        # header + rows spread over the used range, for all the columns
+        range_address = oRange.RangeAddress
+        row_count = range_address.EndRow - range_address.StartRow + 1
+        windows = [(0, 1)] + [
+            (start_row + 1, end_row + 1)
+            for start_row, end_row in sample_windows(row_count - 1)]
+        oColumnsRange = oRange.getCellRangeByPosition(
+            start, 0, end - 1, row_count - 1)
+        sample = fetch_sample(oColumnsRange, windows)
+        headers = sample.values[0]
+        formats = guess_formats(sample.values[1:], sample.format_ids[1:])
+        if not formats:
+            formats = [(0, 0.0)] * len(headers)
+        type_ids = self.format_types.get_type_ids(
+            [format_id for format_id, _ in formats])
         nodes = []
-        oColumns = oRange.Columns
-        for c in range(oColumns.Count):
-            oColumn = oColumns.getByIndex(c)
-            column_name = oColumn.getCellByPosition(0, 0).String
-            if not column_name.strip():
-                column_name = self.ah4lo_lang.empty_word
-
-            oRangeWithoutHeader = oColumn.getCellRangeByPosition(
-                0, 1, 0, oColumn.RangeAddress.EndRow)
-            format_id = guess_format_id(oRangeWithoutHeader)
-            type_id = get_type_id(self.oDoc.NumberFormats, format_id)
-            type_name = self.ah4lo_lang.get_type_name(type_id)
-            text = "{} {}".format(column_name, type_name)
-
-            oController = self.oController
-
-            def action(oController=oController, oColumn=oColumn):
-                oController.select(oColumn)
-
-            node = NodeBuilder(text, action)
+        sheet_name = self.oSheet.Name
+        start_column = range_address.StartColumn
+        for c, header in enumerate(headers, start):
+            column_name = self._get_column_name(header)
+            # an empty column has no confidence
+            confidence = formats[c - start][1]
+            text = Label(self.ah4lo_lang.column, column_name,
+                         type_ids[c - start],
+                         0.0 < confidence < MIN_FORMAT_CONFIDENCE)
+            node = NodeBuilder(text, (SELECT_COLUMN, sheet_name,
+                                      start_column + c))
             nodes.append(node)
-
-        columns_node = NodeBuilder(self.ah4lo_lang.columns(len(nodes)))
-        columns_node.extend_children(nodes)
-        return columns_node
+        return nodes
+
+    def _get_column_name(self, header: Any) -> str:
+        if isinstance(header, float):
+            if header.is_integer():
+                return str(int(header))
+            return str(header)
+        elif not header.strip():
+            return self.ah4lo_lang.empty_word
+        # the header was read with the sample, but a label stays short
+        return shorten(header)
 
     def get_dialogs(self) -> Optional[NodeBuilder]:
         oForms = self.oSheet.DrawPage.Forms
 
         nodes = []
+        sheet_name = self.oSheet.Name
         for i in range(oForms.Count):
             oForm = oForms.getByIndex(i)
             for j in range(oForm.Count):
@@ -164,26 +453,17 @@ class SheetNodeFactory:
                 # SubmitButton
                 # TextField
                 # TimeField
-                text = "{}, {}".format(name, oControlModel.Label)
-
-                def action(oController=self.oController,
-                           oSheet=self.oSheet, oControlModel=oControlModel):
-                    oController.ActiveSheet = oSheet
-                    try:
-                        oControl = self.oController.getControl(oControlModel)
-                    except Exception:
-                        self._logger.exception("control %s",
-                                               oControlModel.Name)
-                    else:
-                        oControl.setFocus()
-
-                node = NodeBuilder(text, action)
+                text = Label(self.ah4lo_lang.control, name,
+                             oControlModel.Label)
+
+                node = NodeBuilder(text, (FOCUS_CONTROL, sheet_name, i, j))
                 nodes.append(node)
 
         if not nodes:
             return None
 
-        dialogs_node = NodeBuilder(self.ah4lo_lang.dialogs(len(nodes)))
+        dialogs_node = NodeBuilder(
+            Label(self.ah4lo_lang.dialogs, len(nodes)))
         dialogs_node.extend_children(nodes)
 
         return dialogs_node
@@ -193,31 +473,25 @@ class SheetNodeFactory:
         return parts[-1]
 
     def get_annotations(self) -> Optional[NodeBuilder]:
-        oAnnotations = self.oSheet.Annotations
-
-        ranges_by_annotation = {}
-        for i in range(oAnnotations.Count):
-            oAnnotation = oAnnotations.getByIndex(i)
+        cells_by_annotation = {}
+        for oAnnotation in to_iter(self.oSheet.Annotations):
             pos = oAnnotation.Position
-            text = oAnnotation.Text.String.strip()
-            oCell = self.oSheet.getCellByPosition(pos.Column, pos.Row)
-            if text in ranges_by_annotation:
-                oRanges = ranges_by_annotation[text]
-            else:
-                oRanges = self.oDoc.createInstance(
-                    "com.sun.star.sheet.SheetCellRanges")
-                ranges_by_annotation[text] = oRanges
+            # two long annotations with the same prefix are merged
+            text = get_text_prefix(oAnnotation.createTextCursor(),
+                                   KEY_MAX_LENGTH).strip()
+            cells_by_annotation.setdefault(text, []).append(
+                (pos.Column, pos.Row))
 
-            oRanges.addRangeAddress(oCell.RangeAddress, True)
-
-        if not ranges_by_annotation:
+        if not cells_by_annotation:
             return None
 
+        sheet_name = self.oSheet.Name
         annotations_node = NodeBuilder(
-            self.ah4lo_lang.annotations(len(ranges_by_annotation)))
-        for annotation, oRanges in ranges_by_annotation.items():
-            node = NodeBuilder(
-                "'{}' : {}".format(annotation, oRanges.RangeAddressesAsString))
+            Label(self.ah4lo_lang.annotations, len(cells_by_annotation)))
+        for annotation, cells in cells_by_annotation.items():
+            node = NodeBuilder(Label(
+                _format_annotation, self.ah4lo_lang, sheet_name,
+                shorten(annotation), coalesce_cells(cells)))
             annotations_node.append_child(node)
         return annotations_node
 
@@ -237,7 +511,7 @@ class SheetNodeFactory:
         if not nodes:
             return None
 
-        charts_node = NodeBuilder(self.ah4lo_lang.charts(len(nodes)))
+        charts_node = NodeBuilder(Label(self.ah4lo_lang.charts, len(nodes)))
         charts_node.extend_children(nodes)
         return charts_node
 
@@ -261,7 +535,7 @@ class SheetNodeFactory:
             return None
 
         data_pilot_tables_node = NodeBuilder(
-            self.ah4lo_lang.dynamic_tables(len(nodes)))
+            Label(self.ah4lo_lang.dynamic_tables, len(nodes)))
         data_pilot_tables_node.extend_children(nodes)
         return data_pilot_tables_node
 
@@ -284,76 +558,229 @@ TEXT_TABLE_SERVICE_NAME = "com.sun.star.text.TextTable"
 
 PARAGRAPH_SERVICE_NAME = "com.sun.star.text.Paragraph"
 
+# cache
+CONTENT_SECTION = "content"
+
+
+def _enumerate(oEnumerationAccess: UnoService) -> Iterable[UnoService]:
+    """
+    Stream the elements of an enumeration access.
+    """
+    oEnumeration = oEnumerationAccess.createEnumeration()
+    while oEnumeration.hasMoreElements():
+        yield oEnumeration.nextElement()
+
+
 # Types
 Paragraph = NewType("Paragraph", UnoService)
 XShape = NewType("XShape", UnoService)
 TextRange = NewType("TextRange", UnoService)
 
 
+class OutlineStyles:
+    """
+    Tell if a paragraph style is an outline style. A style is resolved once:
+    a document has many paragraphs but few styles.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, oParagraphStyles: UnoService,
+                 oNumberingStyles: UnoService):
+        self.oParagraphStyles = oParagraphStyles
+        self.oNumberingStyles = oNumberingStyles
+        self._is_outline_by_name = cast(Dict[str, bool], {})
+        self._uno_calls_by_name = cast(Dict[str, int], {})
+        self.uno_calls = 0
+        self.saved_uno_calls = 0
+
+    def is_outline(self, style_name: str) -> bool:
+        """
+        :param style_name: the name of a paragraph style
+        :return: True if the paragraphs of this style are headings
+        """
+        try:
+            is_outline = self._is_outline_by_name[style_name]
+        except KeyError:
+            is_outline, uno_calls = self._resolve(style_name)
+            self._is_outline_by_name[style_name] = is_outline
+            self._uno_calls_by_name[style_name] = uno_calls
+            self.uno_calls += uno_calls
+        else:
+            self.saved_uno_calls += self._uno_calls_by_name[style_name]
+        return is_outline
+
+    def _resolve(self, style_name: str) -> Tuple[bool, int]:
+        """
+        :param style_name: the name of a paragraph style
+        :return: True if the style is an outline style, and the number of
+        UNO calls that were needed to know it.
+        """
+        oStyle = self.oParagraphStyles.getByName(style_name)
+        uno_calls = 1
+        while True:
+            numbering_style_name = oStyle.NumberingStyleName
+            uno_calls += 1
+            if numbering_style_name == "":
+                return False, uno_calls
+
+            oNumberingStyle = self.oNumberingStyles.getByName(
+                numbering_style_name)
+            oRules = oNumberingStyle.NumberingRules
+            uno_calls += 2
+            if oRules:
+                uno_calls += 1
+                if oRules.NumberingIsOutline:
+                    return True, uno_calls
+
+            parent_style_name = oStyle.ParentStyle
+            uno_calls += 1
+            if parent_style_name == "":
+                return False, uno_calls
+
+            oStyle = self.oParagraphStyles.getByName(parent_style_name)
+            uno_calls += 1
+
+    def log_stats(self):
+        self._logger.debug(
+            "Outline styles: %s styles resolved with %s UNO calls, "
+            "%s UNO calls saved", len(self._is_outline_by_name),
+            self.uno_calls, self.saved_uno_calls)
+
+
+# the properties of a paragraph, read in one call
+PARAGRAPH_PROPERTY_NAMES = ("ParaStyleName", "ListLabelString",
+                            "NumberingLevel")
+
+
+class ParagraphRecord:
+    """
+    The properties of a paragraph that are needed to build its node.
+    """
+    __slots__ = ("style_name", "list_label", "numbering_level")
+
+    def __init__(self, style_name: str, list_label: str,
+                 numbering_level: int):
+        self.style_name = style_name
+        self.list_label = list_label
+        self.numbering_level = numbering_level
+
+
+def fetch_paragraph_record(oParagraph: Paragraph) -> ParagraphRecord:
+    """
+    :param oParagraph: the paragraph
+    :return: the record of the paragraph, read with one UNO call
+    """
+    try:
+        values = oParagraph.getPropertyValues(PARAGRAPH_PROPERTY_NAMES)
+    except Exception:  # an unknown property
+        values = [getattr(oParagraph, name, None)
+                  for name in PARAGRAPH_PROPERTY_NAMES]
+    style_name, list_label, numbering_level = values
+    return ParagraphRecord(style_name or "", list_label or "",
+                           numbering_level or 0)
+
+
+class DrawingIndex:
+    """
+    The drawings of a document: the drawings anchored to a paragraph and
+    the orphan drawings, found in one pass over the draw pages.
+    """
+
+    def __init__(self, drawings_by_paragraph: Dict[Paragraph, List[XShape]],
+                 orphans: List[XShape]):
+        self.drawings_by_paragraph = drawings_by_paragraph
+        self.orphans = orphans
+
+    @staticmethod
+    def create(oDoc: UnoSpreadsheet) -> "DrawingIndex":
+        drawings_by_paragraph = cast(Dict[Paragraph, List[XShape]], {})
+        orphans = cast(List[XShape], [])
+        for oDrawPage in to_iter(oDoc.DrawPages):
+            for oDrawing in to_iter(oDrawPage):
+                oAnchor = oDrawing.Anchor
+                if oAnchor is None:
+                    orphans.append(oDrawing)
+                else:
+                    # pyuno hashes and compares the proxies by interface
+                    # identity: the paragraph given by the text enumeration
+                    # is the same key.
+                    drawings_by_paragraph.setdefault(
+                        oAnchor.TextParagraph, []).append(oDrawing)
+        return DrawingIndex(drawings_by_paragraph, orphans)
+
+    def find_drawings(self, oParagraph: Paragraph) -> List[XShape]:
+        if not self.drawings_by_paragraph:
+            return []
+        return self.drawings_by_paragraph.get(oParagraph, [])
+
+
 class DrawingNodeFactory:
     _logger = logging.getLogger(__name__)
 
     def __init__(self, ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet,
-                 drawings_by_paragraph: Dict[Paragraph, List[XShape]]):
+                 drawing_index: DrawingIndex, outline_styles: OutlineStyles):
         self.ah4lo_lang = ah4lo_lang
         self.oDoc = oDoc
-        self.drawings_by_paragraph = drawings_by_paragraph
+        self.drawing_index = drawing_index
+        self.outline_styles = outline_styles
 
     def find_drawings(self, oParagraph: Paragraph) -> List[XShape]:
-        return self.drawings_by_paragraph.get(oParagraph, [])
+        return self.drawing_index.find_drawings(oParagraph)
 
-    def create_drawing_node(self, oDrawing: XShape, action: Optional[Action]
+    def create_drawing_node(self, oDrawing: XShape,
+                            action: Optional[ActionDescriptor]
                             ) -> NodeBuilder:
         if oDrawing.supportsService(
                 TEXT_EMBEDDED_OBJECT_SERVICE_NAME):
             self._logger.warning("TODO: Embedded object %s",
                                  repr(oDrawing.Component))
-            value = self.ah4lo_lang.embedded_object(oDrawing.Name)
+            value = Label(self.ah4lo_lang.embedded_object, oDrawing.Name)
             return NodeBuilder(value, action)
         elif oDrawing.supportsService(TEXT_FRAME_SERVICE_NAME):
-            value = self.ah4lo_lang.text_frame(oDrawing.Name)
-            tf_node = NodeBuilder(
-                value, action)
-            WriterRangeContentBuilder(
-                self.ah4lo_lang, self.oDoc, oDrawing, tf_node,
-                self
-            ).build()
-            return tf_node
+            value = Label(self.ah4lo_lang.text_frame, oDrawing.Name)
+
+            def loader(oDrawing=oDrawing) -> List[NodeBuilder]:
+                return WriterRangeContentBuilder(
+                    self.ah4lo_lang, self.oDoc, oDrawing, NodeBuilder(value),
+                    self, self.outline_styles, oDrawing.Name
+                ).build().children
+
+            return NodeBuilder(value, action, loader)
         elif oDrawing.supportsService(
                 TEXT_GRAPHIC_OBJECT_SERVICE_NAME):
-            value = self.ah4lo_lang.graphic_object(
-                oDrawing.Name)
+            value = Label(self.ah4lo_lang.graphic_object, oDrawing.Name)
             return NodeBuilder(value, action)
         elif oDrawing.supportsService(SHAPE_SERVICE_NAME):
-            value = self.ah4lo_lang.shape(oDrawing.Name)
+            value = Label(self.ah4lo_lang.shape, oDrawing.Name)
             return NodeBuilder(value, action)
         else:
             self._logger.warning(
                 "Unkown drawing: %s", repr(oDrawing))
-            value = self.ah4lo_lang.unknown_drawing(oDrawing.Name)
+            value = Label(self.ah4lo_lang.unknown_drawing, oDrawing.Name)
             return NodeBuilder(value, action)
 
 
 class WriterDocumentNodeFactory:
     _logger = logging.getLogger(__name__)
 
-    def __init__(self, ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet):
+    def __init__(self, ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet,
+                 cache: Optional[DocumentCache] = None):
         self.ah4lo_lang = ah4lo_lang
         self.oDoc = oDoc
+        self.cache = cache
         self.oParagraphStyles = self.oDoc.StyleFamilies.ParagraphStyles
         self.oNumberingStyles = self.oDoc.StyleFamilies.NumberingStyles
+        self.outline_styles = OutlineStyles(self.oParagraphStyles,
+                                            self.oNumberingStyles)
 
     def get_root(self) -> Node:
+        if self.cache is not None and self.cache.root is not None:
+            return self.cache.root
+
         oProperties = self.oDoc.DocumentProperties
-        drawings_by_paragraph = {}
-        for oDrawPage in to_iter(self.oDoc.DrawPages):
-            for oDrawing in to_iter(oDrawPage):
-                oAnchor = oDrawing.Anchor
-                if oAnchor is not None:
-                    drawings_by_paragraph.setdefault(
-                        oAnchor.TextParagraph, []).append(oDrawing)
         drawing_node_factory = DrawingNodeFactory(
-            self.ah4lo_lang, self.oDoc, drawings_by_paragraph)
+            self.ah4lo_lang, self.oDoc, DrawingIndex.create(self.oDoc),
+            self.outline_styles)
 
         root_node = NodeBuilder(oProperties.Title)
 
@@ -367,22 +794,27 @@ class WriterDocumentNodeFactory:
         if orphans_node:
             root_node.append_child(orphans_node)
 
-        root_node.freeze_as_root()
-        return root_node
+        root = root_node.freeze_as_root()
+        root.store.resolver = ActionResolver(self.oDoc, self.cache)
+        if self.cache is not None:
+            self.cache.root = root
+        return root
 
     def _create_informations_node(self) -> NodeBuilder:
         oProperties = self.oDoc.DocumentProperties
-        information_node = NodeBuilder(self.ah4lo_lang.informations())
+        information_node = NodeBuilder(Label(self.ah4lo_lang.informations))
         if oProperties.Author.strip():
-            value = self.ah4lo_lang.writer_author(oProperties.Author)
+            value = Label(self.ah4lo_lang.writer_author, oProperties.Author)
             author_node = NodeBuilder(value)
             information_node.append_child(author_node)
         if oProperties.Subject.strip():
-            value = self.ah4lo_lang.writer_subject(oProperties.Subject)
+            value = Label(self.ah4lo_lang.writer_subject,
+                          oProperties.Subject)
             subject_node = NodeBuilder(value)
             information_node.append_child(subject_node)
         if oProperties.Description.strip():
-            value = self.ah4lo_lang.writer_description(oProperties.Description)
+            value = Label(self.ah4lo_lang.writer_description,
+                          oProperties.Description)
             description_node = NodeBuilder(value)
             information_node.append_child(description_node)
 
@@ -391,31 +823,34 @@ class WriterDocumentNodeFactory:
             oStatistics, ("PageCount", "ParagraphCount", "WordCount")
         )
         statistics_node = NodeBuilder(
-            self.ah4lo_lang.statistics(
-                page_count, paragraph_count, word_count))
+            Label(self.ah4lo_lang.statistics,
+                  page_count, paragraph_count, word_count))
         information_node.append_child(statistics_node)
         return information_node
 
     def _create_content_node(
             self, drawing_node_factory: DrawingNodeFactory
     ) -> NodeBuilder:
-        oCursor = self.oDoc.Text.createTextCursor()
-        oCursor.gotoStart(False)
-        oCursor.gotoEnd(True)
-
-        content_node = NodeBuilder(self.ah4lo_lang.content())
-        return WriterRangeContentBuilder(
-            self.ah4lo_lang, self.oDoc, oCursor, content_node,
-            drawing_node_factory).build()
+        def loader() -> List[NodeBuilder]:
+            oCursor = self.oDoc.Text.createTextCursor()
+            oCursor.gotoStart(False)
+            oCursor.gotoEnd(True)
+
+            return WriterRangeContentBuilder(
+                self.ah4lo_lang, self.oDoc, oCursor,
+                NodeBuilder(Label(self.ah4lo_lang.content)),
+                drawing_node_factory, self.outline_styles).build().children
+
+        if self.cache is not None:
+            # the Writer API does not tell which part of the text was
+            # modified: any modification makes the content stale.
+            self.cache.watch(CONTENT_SECTION, self.oDoc)
+            loader = self.cache.cached_loader(CONTENT_SECTION, loader)
+        return NodeBuilder(Label(self.ah4lo_lang.content), None, loader)
 
     def _create_orphans_node(self, drawing_node_factory: DrawingNodeFactory
                              ) -> Optional[NodeBuilder]:
-        orphans = []
-        for oDrawPage in to_iter(self.oDoc.DrawPages):
-            for oDrawing in to_iter(oDrawPage):
-                oAnchor = oDrawing.Anchor
-                if oAnchor is None:
-                    orphans.append(oDrawing)
+        orphans = drawing_node_factory.drawing_index.orphans
         if orphans:
             orphans_node = NodeBuilder("Orphan drawings")
             for orphan in orphans:
@@ -427,103 +862,242 @@ class WriterDocumentNodeFactory:
         return orphans_node
 
 
+# the kinds of the elements of a group: a table, a paragraph and its
+# drawings, the drawings of a title
+_TABLE = 0
+_PARAGRAPH = 1
+_DRAWINGS = 2
+
+
 class WriterRangeContentBuilder:
     _logger = logging.getLogger(__name__)
 
     def __init__(self, ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet,
                  oTextRange: TextRange, content_node: NodeBuilder,
-                 drawing_node_factory: "DrawingNodeFactory"):
+                 drawing_node_factory: "DrawingNodeFactory",
+                 outline_styles: OutlineStyles, frame_name: str = ""):
         self.ah4lo_lang = ah4lo_lang
         self.oDoc = oDoc
         self.oTextRange = oTextRange
+        # the text frame that holds the range, or "" for the document
+        self.frame_name = frame_name
         self.content_node = content_node
         self.drawing_node_factory = drawing_node_factory
-
-        self.oParagraphStyles = self.oDoc.StyleFamilies.ParagraphStyles
-        self.oNumberingStyles = self.oDoc.StyleFamilies.NumberingStyles
-        self.cur_nodes = []
+        self.outline_styles = outline_styles
+        self.grouper = NodeGrouper(self.ah4lo_lang.paragraphs)
         self.nodes_stack = [content_node]
+        # the elements of the next group: (ordinal, element, kind)
+        self._elements = cast(List[Tuple[int, UnoService, int]], [])
+        self._node_count = 0
+        # moved to each paragraph to read the beginning of its text
+        self._oCursor = cast(Optional[UnoService], None)
 
     def build(self) -> NodeBuilder:
+        """
+        Build the outline of the range. The titles are read now, but the
+        other elements are read by groups, when a group is entered: the
+        outline is shown early and the loading may stop between two
+        groups.
+
+        :return: the content node
+        """
         cursor_text = self.oTextRange.Text
-        for oElement in to_iter(cursor_text):
-            oController = self.oDoc.CurrentController
-
-            def action(oController: UnoController = oController,
-                       oElement=oElement):
-                oController.ViewCursor.gotoRange(oElement.Anchor.Start, False)
-
+        self._oCursor = cursor_text.createTextCursor()
+        for ordinal, oElement in enumerate(_enumerate(cursor_text)):
             if oElement.supportsService(TEXT_TABLE_SERVICE_NAME):
-                self._logger.debug("Table %s", repr(oElement))
-                table_name = oElement.Name
-                columns_count = oElement.Columns.Count
-                rows_count = oElement.Rows.Count
-                value = self.ah4lo_lang.writer_table(table_name, columns_count,
-                                                     rows_count)
-                table_node = NodeBuilder(value, action)
-                self.cur_nodes.append(table_node)
+                self._append_element(ordinal, oElement, _TABLE)
+                continue
+
+            record = fetch_paragraph_record(oElement)
+            outline_level = self._get_outline_level(record)
+            if outline_level > 0:
+                self._flush_nodes()
+
+                value = Label(
+                    self.ah4lo_lang.writer_title, record.list_label,
+                    self._get_text(oElement, TITLE_MAX_LENGTH))
+                title_node = NodeBuilder(
+                    value, (GOTO_ELEMENT, self.frame_name, ordinal))
+                if outline_level < len(self.nodes_stack):
+                    self.nodes_stack = self.nodes_stack[:outline_level]
+                self.nodes_stack[-1].append_child(title_node)
+                self.nodes_stack.append(title_node)
+                if self.drawing_node_factory.find_drawings(oElement):
+                    self._append_element(ordinal, oElement, _DRAWINGS)
             else:
-                outline_level = self._get_outline_level(oElement)
-                if outline_level > 0:
-                    self._flush_nodes()
-
-                    value = self.ah4lo_lang.writer_title(
-                        oElement.ListLabelString, oElement.String)
-                    title_node = NodeBuilder(value, action)
-                    if outline_level < len(self.nodes_stack):
-                        self.nodes_stack = self.nodes_stack[:outline_level]
-                    self.nodes_stack[-1].append_child(title_node)
-                    self.nodes_stack.append(title_node)
-                else:
-                    par_text = self._shorten(oElement.String, 50)
-                    par_node = NodeBuilder(
-                        self.ah4lo_lang.paragraph(par_text),
-                        action)
-                    self.cur_nodes.append(par_node)
-
-                dnf = self.drawing_node_factory
-                for oDrawing in dnf.find_drawings(
-                        oElement.TextParagraph):
-                    drawing_node = dnf.create_drawing_node(
-                        oDrawing, action)
-                    self.cur_nodes.append(drawing_node)
+                self._append_element(ordinal, oElement, _PARAGRAPH)
 
         self._flush_nodes()
+        self.outline_styles.log_stats()
         return self.content_node
 
-    def _shorten(self, text, max_len):
-        if len(text) < max_len:
-            par_text = text
+    def _append_element(self, ordinal: int, oElement: UnoService,
+                        kind: int):
+        if kind == _TABLE:
+            count = 1
         else:
-            par_text = text[:max_len - 3] + "..."
-        return par_text
+            # the element of the enumeration is the paragraph
+            count = len(self.drawing_node_factory.find_drawings(oElement))
+            if kind == _PARAGRAPH:
+                count += 1
+        if self._elements and self._node_count + count > CHUNK_SIZE:
+            self._append_group()
+        self._elements.append((ordinal, oElement, kind))
+        self._node_count += count
+
+    def _append_group(self):
+        group_node = self.grouper.append_group(self._node_count)
+        group_node.loader = functools.partial(
+            self._load_group, group_node, self._elements)
+        self._elements = []
+        self._node_count = 0
+
+    def _load_group(self, group_node: NodeBuilder,
+                    elements: List[Tuple[int, UnoService, int]]
+                    ) -> List[NodeBuilder]:
+        """
+        Create the nodes of a group. The group node keeps its children
+        rather than its loader: the document cache holds the group node, but
+        not the elements, the cursor and this builder.
+        """
+        nodes = self._load_elements(elements)
+        group_node.loader = None
+        group_node.extend_children(nodes)
+        return nodes
+
+    def _load_elements(self, elements: List[Tuple[int, UnoService, int]]
+                       ) -> List[NodeBuilder]:
+        nodes = []
+        dnf = self.drawing_node_factory
+        for ordinal, oElement, kind in elements:
+            action = (GOTO_ELEMENT, self.frame_name, ordinal)
+            if kind == _TABLE:
+                self._logger.debug("Table %s", repr(oElement))
+                value = Label(self.ah4lo_lang.writer_table, oElement.Name,
+                              oElement.Columns.Count, oElement.Rows.Count)
+                nodes.append(NodeBuilder(value, action))
+                continue
+
+            if kind == _PARAGRAPH:
+                par_text = self._get_text(oElement, LABEL_MAX_LENGTH)
+                nodes.append(NodeBuilder(
+                    Label(self.ah4lo_lang.paragraph, par_text), action))
+            for oDrawing in dnf.find_drawings(oElement):
+                nodes.append(dnf.create_drawing_node(oDrawing, action))
+        return nodes
+
+    def _get_text(self, oParagraph: Paragraph, max_len: int) -> str:
+        """
+        :return: the text of the paragraph, shortened to `max_len` chars.
+        At most `max_len` chars are read.
+        """
+        self._oCursor.gotoRange(oParagraph.Start, False)
+        return shorten(get_text_prefix(self._oCursor, max_len, True),
+                       max_len)
 
     def _flush_nodes(self):
-        parent_node = self.nodes_stack[-1]
-        step = 10
-        for i in range(0, len(self.cur_nodes), step):
-            nodes = self.cur_nodes[i: i + step]
-            pars_node = NodeBuilder(
-                self.ah4lo_lang.paragraphs(i + 1, i + len(nodes)))
-            for node in nodes:
-                pars_node.append_child(node)
-
-            parent_node.append_child(pars_node)
-        self.cur_nodes = []
-
-    def _get_outline_level(self, oElement) -> int:
-        oStyle = self.oParagraphStyles.getByName(oElement.ParaStyleName)
-        while True:
-            if oStyle.NumberingStyleName == "":
-                return -1
-            oNumberingStyle = self.oNumberingStyles.getByName(
-                oStyle.NumberingStyleName)
-            oRules = oNumberingStyle.NumberingRules
+        if self._elements:
+            self._append_group()
+        self.nodes_stack[-1].extend_children(self.grouper.close())
 
-            if oRules and oRules.NumberingIsOutline:
-                return oElement.NumberingLevel + 1  # 1 for heading 1
-            if oStyle.ParentStyle == "":
-                return -1
+    def _get_outline_level(self, record: ParagraphRecord) -> int:
+        if self.outline_styles.is_outline(record.style_name):
+            return record.numbering_level + 1  # 1 for heading 1
+        return -1
 
-            oStyle = self.oParagraphStyles.getByName(
-                oStyle.ParentStyle)
+
+# number of rows or elements read at once to fill the content index
+INDEX_CHUNK_SIZE = 1000
+
+
+def get_calc_index_sections(ah4lo_lang: AH4LOLang, oDoc: UnoSpreadsheet
+                            ) -> List[Section]:
+    """
+    :return: the sections of the content index, one per sheet
+    """
+    oSheets = oDoc.Sheets
+    sections = []
+    for i in range(oSheets.Count):
+        oSheet = oSheets.getByIndex(i)
+        sections.append((oSheet.Name, functools.partial(
+            _read_sheet, ah4lo_lang, oSheet)))
+    return sections
+
+
+def _read_sheet(ah4lo_lang: AH4LOLang, oSheet: UnoSheet
+                ) -> Iterable[Chunk]:
+    """
+    Read the used range by chunks of rows. The texts of a column in a
+    chunk are joined: the target of a cell is its column.
+    """
+    sheet_name = oSheet.Name
+    oRange = get_used_range(oSheet)
+    range_address = oRange.RangeAddress
+    start_column = range_address.StartColumn
+    column_count = range_address.EndColumn - start_column + 1
+    row_count = range_address.EndRow - range_address.StartRow + 1
+    targets = [
+        (Label(ah4lo_lang.sheet_column, sheet_name,
+               column_name(start_column + c)),
+         (SELECT_COLUMN, sheet_name, start_column + c))
+        for c in range(column_count)]
+    for start_row in range(0, row_count, INDEX_CHUNK_SIZE):
+        end_row = min(start_row + INDEX_CHUNK_SIZE, row_count)
+        data_array = oRange.getCellRangeByPosition(
+            0, start_row, column_count - 1, end_row - 1).DataArray
+        chunk = []
+        for c, column in enumerate(zip(*data_array)):
+            text = " ".join(_format_value(value) for value in column
+                            if value != "")
+            if text:
+                value, action = targets[c]
+                chunk.append((value, action, text))
+        yield chunk
+
+
+def get_writer_index_sections(ah4lo_lang: AH4LOLang, oDoc: UnoService
+                              ) -> List[Section]:
+    """
+    :return: the section of the content index: the text of the document.
+    The text frames are not indexed.
+    """
+    return [(CONTENT_SECTION, functools.partial(_read_text, ah4lo_lang,
+                                                oDoc.Text))]
+
+
+def _read_text(ah4lo_lang: AH4LOLang, oText: UnoService
+               ) -> Iterable[Chunk]:
+    """
+    Read the whole text of the paragraphs and tables, by chunks of elements.
+    """
+    chunk = []
+    for ordinal, oElement in enumerate(_enumerate(oText)):
+        action = (GOTO_ELEMENT, "", ordinal)
+        if oElement.supportsService(TEXT_TABLE_SERVICE_NAME):
+            try:
+                data_array = oElement.DataArray
+            except Exception:  # a table with merged cells
+                data_array = ()
+            text = " ".join(_format_value(value) for row in data_array
+                            for value in row if value != "")
+            value = Label(ah4lo_lang.writer_table, oElement.Name,
+                          len(data_array[0]) if data_array else 0,
+                          len(data_array))
+        else:
+            text = oElement.String
+            value = Label(ah4lo_lang.paragraph, shorten(text))
+        if text:
+            chunk.append((value, action, text))
+        if len(chunk) == INDEX_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return str(value)
+    return value
@@ -1,9 +1,17 @@
+import functools
 import logging
-from typing import Iterator
-
-from ah4lo_data import CalcDocumentNodeFactory, WriterDocumentNodeFactory
+import threading
+import time
+from typing import Optional, Set, List, Tuple, Dict, Callable, cast
+
+from ah4lo_cache import DocumentCache
+from ah4lo_data import (CalcDocumentNodeFactory, WriterDocumentNodeFactory,
+                        get_calc_index_sections, get_writer_index_sections,
+                        group_nodes, CHUNK_SIZE)
 from ah4lo_lang import AH4LOLang
-from ah4lo_tree import Node, Tree
+from ah4lo_search import ContentIndex, ContentIndexer, Section
+from ah4lo_tree import (Node, NodeBuilder, Tree, BackgroundLoader, LabelIndex,
+                        Label, Resolver, Action)
 from lo_helper import extract_values
 from py4lo_dialogs import place_widget, Control, ControlModel
 from py4lo_helper import create_uno_service, unohelper
@@ -16,6 +24,13 @@ except ImportError:
     class XKeyListener:
         pass
 
+try:
+    # noinspection PyUnresolvedReferences
+    from com.sun.star.awt import XCallback
+except ImportError:
+    class XCallback:
+        pass
+
 # Constants
 DOWN_KEY = 0x400
 UP_KEY = 0x401
@@ -29,63 +44,369 @@ PAGEDOWN_KEY = 0x407
 
 ENTER_KEY = 0x500
 ESC_KEY = 0x501
+BACKSPACE_KEY = 0x503
+
+F3_KEY = 0x302
+F_KEY = 0x205
+
+# modifiers that make a key a shortcut rather than a typed character
+MOD1 = 2
+MOD2 = 4
+
+# the moves of the focus, applied when the key is pressed (and repeated)
+_MOVE_BY_KEY = cast(Dict[int, Callable[[Tree], None]], {
+    DOWN_KEY: Tree.down,
+    UP_KEY: Tree.up,
+    RIGHT_KEY: Tree.right,
+    LEFT_KEY: Tree.left,
+    HOME_KEY: Tree.home,
+    END_KEY: Tree.end,
+    PAGEUP_KEY: Tree.page_up,
+    PAGEDOWN_KEY: Tree.page_down,
+})
+
+# min time between two redraws, in seconds
+FRAME_INTERVAL = 0.05
+# a query is forgotten after this delay without a typed character, in seconds
+TYPE_AHEAD_TIMEOUT = 1.5
+# max number of results of a content search
+MAX_RESULT_COUNT = 1000
+
+
+class TypeAhead:
+    """
+    Jump to the nodes whose label starts with the characters typed by the
+    user.
+    """
+
+    def __init__(self, tree: Tree, timeout: float = TYPE_AHEAD_TIMEOUT):
+        self.tree = tree
+        self.timeout = timeout
+        self.query = ""
+        self._last_time = 0.0
+        # built on first use: it formats every label
+        self._index = cast(Optional[LabelIndex], None)
+
+    @property
+    def active(self) -> bool:
+        return bool(self.query) and (
+                time.perf_counter() - self._last_time < self.timeout)
+
+    def type(self, char: str) -> bool:
+        """
+        Add a character to the query and go to the first match, starting
+        from the focus.
+
+        :return: True if a node matches
+        """
+        if not self.active:
+            self.query = ""
+        self.query += char
+        return self._jump(self.tree.focus.index - 1)
+
+    def erase(self) -> bool:
+        self.query = self.query[:-1]
+        if not self.query:
+            return False
+        return self._jump(self.tree.focus.index - 1)
+
+    def next(self) -> bool:
+        """
+        Go to the next match.
+
+        :return: True if a node matches
+        """
+        return self._jump(self.tree.focus.index)
+
+    def clear(self):
+        self.query = ""
+
+    def _jump(self, after: int) -> bool:
+        self._last_time = time.perf_counter()
+        if self._index is None:
+            self._index = LabelIndex(self.tree.root.store)
+        node = self._index.find(self.query, after)
+        if node is None:
+            return False
+        self.tree.goto(node)
+        return True
+
+
+class MainThreadCallback(unohelper.Base, XCallback):
+    """
+    A function called on the main thread.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, function: Action):
+        self.function = function
+
+    def notify(self, _data):
+        # noinspection PyBroadException
+        try:
+            self.function()
+        except Exception:
+            self._logger.exception("Callback")
+
+
+def post_to_main_thread(function: Action):
+    """
+    Call a function on the main thread, once the pending events are
+    processed. The main thread holds the SolarMutex while it handles an
+    event: a worker thread must not call the controls.
+
+    :param function: the function
+    """
+    oAsyncCallback = create_uno_service("com.sun.star.awt.AsyncCallback")
+    oAsyncCallback.addCallback(MainThreadCallback(function), None)
 
 
 class ItemKeyListener(unohelper.Base, XKeyListener):
+    """
+    The moves are applied on key press, hence on every repeat of a held
+    key, but the lines are redrawn at most once per `FRAME_INTERVAL`. A
+    redraw of the final state follows the last move: it is posted to the
+    main thread at the end of the frame.
+    """
     _logger = logging.getLogger(__name__)
 
-    def __init__(self, helper: "ScrollTreeHelper", oDialogControl: UnoControl):
+    def __init__(self, helper: "ScrollTreeHelper", oDialogControl: UnoControl,
+                 frame_interval: float = FRAME_INTERVAL):
         self.helper = helper
         self.oDialogControl = oDialogControl
+        self.frame_interval = frame_interval
+        # time to handle the last key and the slowest key, in seconds
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._last_redraw = 0.0
+        self._redraw_timer = cast(Optional[threading.Timer], None)
+        self._closed = False
 
-    def keyPressed(self, _e):
-        pass
+    def keyPressed(self, e):
+        self._handle(e, self._key_pressed)
 
     def keyReleased(self, e):
+        self._handle(e, self._key_released)
+
+    def _handle(self, e, handler: Callable):
         self._logger.debug("Key %s", e.KeyCode)
+        start = time.perf_counter()
         # noinspection PyBroadException
         try:
-            state = self.helper.tree
-            if e.KeyCode == DOWN_KEY:
-                state.down()
-            elif e.KeyCode == UP_KEY:
-                state.up()
-            elif e.KeyCode == RIGHT_KEY:
-                state.right()
-            elif e.KeyCode == LEFT_KEY:
-                state.left()
-            elif e.KeyCode == ENTER_KEY:
-                state.enter()
-            elif e.KeyCode == UP_KEY:
-                state.up()
-            elif e.KeyCode == HOME_KEY:
-                state.home()
-            elif e.KeyCode == END_KEY:
-                state.end()
-            elif e.KeyCode == PAGEUP_KEY:
-                state.page_up()
-            elif e.KeyCode == PAGEDOWN_KEY:
-                state.page_down()
-            elif e.KeyCode == ESC_KEY:
-                self.oDialogControl.setVisible(False)
-                self.oDialogControl.dispose()
-                return
-
-            self.helper.place_lines(self.oDialogControl)
+            with self.helper.lock:
+                handler(e)
         except Exception:
             self._logger.exception("Key")
+        self.last_latency = time.perf_counter() - start
+        self.max_latency = max(self.max_latency, self.last_latency)
+        self._logger.debug("Key %s handled in %.1f ms", e.KeyCode,
+                           self.last_latency * 1000)
+
+    def _key_pressed(self, e):
+        helper = self.helper
+        if helper.search_query is not None:
+            self._search_key_pressed(e)
+            return
+
+        type_ahead = helper.type_ahead
+        move = _MOVE_BY_KEY.get(e.KeyCode)
+        if move is not None:
+            type_ahead.clear()
+            move(helper.tree)
+        elif e.KeyCode == BACKSPACE_KEY and type_ahead.active:
+            type_ahead.erase()
+        elif e.KeyCode == F_KEY and e.Modifiers & MOD1:
+            helper.start_query()
+        else:
+            char = _get_typed_char(e)
+            if not char:
+                return
+            type_ahead.type(char)
+        self._request_redraw()
+
+    def _search_key_pressed(self, e):
+        helper = self.helper
+        if e.KeyCode == BACKSPACE_KEY:
+            helper.search_query = helper.search_query[:-1]
+        else:
+            char = _get_typed_char(e)
+            if not char:
+                return
+            helper.search_query += char
+        helper.show_prompt()
+        self._request_redraw()
+
+    def _key_released(self, e):
+        helper = self.helper
+        type_ahead = helper.type_ahead
+        if e.KeyCode == ESC_KEY:
+            if helper.search_query is None and type_ahead.active:
+                type_ahead.clear()
+            elif helper.tree is not helper.document_tree:
+                helper.show_document()
+                self._redraw()
+            else:
+                self._close()
+        elif e.KeyCode == ENTER_KEY:
+            if helper.search_query is not None:
+                helper.show_results()
+            elif type_ahead.active:
+                type_ahead.next()
+            else:
+                helper.tree.enter()
+            self._redraw()
+        elif e.KeyCode == F3_KEY:
+            if type_ahead.query:
+                type_ahead.next()
+            self._redraw()
+        else:
+            # the move or the typed character was applied on key press
+            self._request_redraw()
+
+    def _request_redraw(self):
+        """
+        Redraw now if the last redraw is old enough, else let a timer post
+        a redraw of the state at the end of the frame. The timer thread
+        does not touch the controls.
+        """
+        if self._redraw_timer is not None:
+            return
+
+        elapsed = time.perf_counter() - self._last_redraw
+        if elapsed >= self.frame_interval:
+            self._redraw()
+        else:
+            self._redraw_timer = threading.Timer(
+                self.frame_interval - elapsed, self.helper.post,
+                (self._on_frame,))
+            self._redraw_timer.daemon = True
+            self._redraw_timer.start()
+
+    def _on_frame(self):
+        # on the main thread
+        with self.helper.lock:
+            self._redraw_timer = None
+            if not self._closed:
+                self._redraw()
+
+    def _redraw(self):
+        self._last_redraw = time.perf_counter()
+        self.helper.place_lines(self.oDialogControl)
+
+    def _close(self):
+        self._closed = True
+        if self._redraw_timer is not None:
+            self._redraw_timer.cancel()
+            self._redraw_timer = None
+        self.helper.stop_loading()
+        self.oDialogControl.setVisible(False)
+        self.oDialogControl.dispose()
+
+
+def _get_typed_char(e) -> str:
+    """
+    :param e: a key event
+    :return: the printable character typed, or "" for a shortcut or a
+    special key.
+    """
+    if e.Modifiers & (MOD1 | MOD2):
+        return ""
+    # pyuno wraps the chars in `uno.Char`
+    char = getattr(e.KeyChar, "value", e.KeyChar)
+    if isinstance(char, str) and len(char) == 1 and char.isprintable():
+        return char
+    return ""
+
+
+class ContentSearch:
+    """
+    Search the content index of a document and build the tree of the
+    results. The index is filled in the background from the first search
+    (Ctrl+F) until the dialog is closed: a user that never searches does
+    not pay for the indexing.
+    """
+
+    def __init__(self, ah4lo_lang: AH4LOLang, index: ContentIndex,
+                 resolver: Optional[Resolver],
+                 get_sections: Callable[[], List[Section]] = list):
+        """
+        :param get_sections: returns the sections of the document, called
+        on the first search
+        """
+        self.ah4lo_lang = ah4lo_lang
+        self.index = index
+        # the results execute the actions of the document tree
+        self.resolver = resolver
+        self.get_sections = get_sections
+        self._indexer = cast(Optional[ContentIndexer], None)
+
+    def start(self):
+        """
+        Start indexing the sections that are not indexed yet, unless the
+        indexer is already running.
+        """
+        if self._indexer is not None:
+            return
+        self._indexer = ContentIndexer(self.index, self.get_sections())
+        self._indexer.start()
+
+    def stop(self):
+        if self._indexer is not None:
+            self._indexer.cancel()
+            self._indexer = None
+
+    def prompt_root(self, query: str) -> Node:
+        return NodeBuilder(
+            Label(self.ah4lo_lang.search_prompt, query)).freeze_as_root()
+
+    def results_root(self, query: str) -> Node:
+        targets = self.index.search(query)[:MAX_RESULT_COUNT]
+        nodes = [NodeBuilder(value, action) for value, action in targets]
+        root_node = NodeBuilder(Label(self.ah4lo_lang.search_results, query,
+                                      len(targets), self.index.partial))
+        if len(nodes) <= CHUNK_SIZE:
+            root_node.extend_children(nodes)
+        else:
+            root_node.extend_children(
+                group_nodes(nodes, self.ah4lo_lang.results_range))
+        root = root_node.freeze_as_root()
+        root.store.resolver = self.resolver
+        return root
 
 
 class ScrollTreeHelper:
     _logger = logging.getLogger(__name__)
 
     def __init__(self, root: Node, line_count: int, width: int, height: int,
-                 prefix: str = "scroll_tree"):
-        self.tree = Tree(root)
+                 prefix: str = "scroll_tree",
+                 post: Callable[[Action], None] = post_to_main_thread):
+        """
+        :param post: a function that calls a function on the main thread
+        """
+        self.document_tree = Tree(root)
+        # the document tree, the search prompt or the search results
+        self.tree = self.document_tree
+        self.type_ahead = TypeAhead(self.tree)
+        self._document_type_ahead = self.type_ahead
+        self.search = cast(Optional[ContentSearch], None)
+        # the query being typed, or None
+        self.search_query = cast(Optional[str], None)
         self.line_count = line_count
         self.width = width
         self.height = height
         self.prefix = prefix
+        self.post = post
+        # held by the main thread while the tree is read or changed
+        self.lock = threading.RLock()
+        self._background_loader = cast(Optional[BackgroundLoader], None)
+        # a redraw of the loaded lines is posted to the main thread
+        self._redraw_posted = False
+        self._visible_indices = cast(Set[int], set())
+        # the last (visible, label) pushed to each line, None if unknown
+        self._rendered = cast(List[Optional[Tuple[bool, Optional[str]]]],
+                              [None] * line_count)
+        # the line controls, in display order
+        self._controls = cast(Optional[List[UnoControl]], None)
 
     def create_models(self, oDialogModel: UnoControlModel):
         for i in range(self.line_count):
@@ -101,58 +422,225 @@ class ScrollTreeHelper:
                 oTextModel.FontWeight = 150
             oDialogModel.insertByName(identifier, oTextModel)
 
-    def _get_controls(self, oDialogControl: UnoControl
-                      ) -> Iterator[UnoControl]:
-        for oControl in oDialogControl.getControls():
-            if oControl.Model.Name.startswith(self.prefix):
-                yield oControl
+    def bind_controls(self, oDialogControl: UnoControl):
+        """
+        Find the line controls once, in display order.
+        """
+        self._controls = [
+            oDialogControl.getControl("{}{}".format(self.prefix, i))
+            for i in range(self.line_count)]
+
+    def _get_controls(self, oDialogControl: UnoControl) -> List[UnoControl]:
+        if self._controls is None:
+            self.bind_controls(oDialogControl)
+        return self._controls
 
     def add_keys(self, oDialogControl: UnoControl):
         listener = ItemKeyListener(self, oDialogControl)
         for oControl in self._get_controls(oDialogControl):
             oControl.addKeyListener(listener)
 
+    def start_loading(self, oDialogControl: UnoControl):
+        """
+        Load the lazy subtrees in the background. The lines are redrawn on
+        the main thread when a visible subtree is loaded.
+        """
+        def on_loaded(index: int):
+            # called by the worker: no UNO call and no wait for the lock
+            if index in self._visible_indices and not self._redraw_posted:
+                self._redraw_posted = True
+                self.post(functools.partial(self._redraw_loaded,
+                                            oDialogControl))
+
+        self._background_loader = BackgroundLoader(
+            self.document_tree.root.store, on_loaded)
+        self._background_loader.start()
+
+    def _redraw_loaded(self, oDialogControl: UnoControl):
+        with self.lock:
+            self._redraw_posted = False
+            if (self._background_loader is None
+                    or self.tree is not self.document_tree):
+                return
+            # the user may have entered the node before it was loaded
+            self.tree.resume()
+            self.place_lines(oDialogControl)
+
+    def stop_loading(self):
+        if self._background_loader is not None:
+            self._background_loader.cancel()
+            self._background_loader = None
+        if self.search is not None:
+            self.search.stop()
+
+    def start_query(self):
+        """
+        Start typing a content search, if the search is enabled.
+        """
+        if self.search is None:
+            return
+        self.search.start()
+        self.search_query = ""
+        self.show_prompt()
+
+    def show_prompt(self):
+        self.tree = Tree(self.search.prompt_root(self.search_query))
+
+    def show_results(self):
+        self.tree = Tree(self.search.results_root(self.search_query))
+        self.type_ahead = TypeAhead(self.tree)
+        self.search_query = None
+
+    def show_document(self):
+        self.search_query = None
+        self.tree = self.document_tree
+        self.type_ahead = self._document_type_ahead
+
     def place_lines(self, oDialogControl: UnoControl):
-        controls = list(self._get_controls(oDialogControl))
+        controls = self._get_controls(oDialogControl)
         if len(controls) == 0:
             self._logger.warning("No lines available!")
             return
 
         base_index = len(controls) // 2
+        previous_nodes, next_nodes = self._get_window(
+            base_index, self.line_count - base_index - 1)
 
         oTextControl = controls[base_index]
-        oTextControl.Visible = True
-        oTextControl.Model.Label = self.tree.text(self.tree.focus)
+        self._place_line(base_index, oTextControl, self.tree.focus)
         oTextControl.setFocus()
 
-        f = self.tree.focus
         for i in range(base_index - 1, -1, -1):
-            oTextControl = controls[i]
-            f = f.previous() if f else None
-            if f is None:
-                oTextControl.Visible = False
-            else:
-                oTextControl.Visible = True
-                oTextControl.Model.Label = self.tree.text(f)
+            j = base_index - 1 - i
+            self._place_line(i, controls[i], previous_nodes[j]
+                             if j < len(previous_nodes) else None)
 
-        f = self.tree.focus
         for i in range(base_index + 1, self.line_count):
-            oTextControl = controls[i]
-            f = f.next() if f else None
-            if f is None:
+            j = i - base_index - 1
+            self._place_line(i, controls[i], next_nodes[j]
+                             if j < len(next_nodes) else None)
+
+    def _get_window(self, previous_count: int, next_count: int
+                    ) -> Tuple[List[Node], List[Node]]:
+        """
+        :return: the nodes above the focus, nearest first, and the nodes
+        below the focus. The visible nodes are recorded.
+        """
+        focus = self.tree.focus
+        previous_nodes = focus.previous_nodes(previous_count)
+        next_nodes = focus.next_nodes(next_count)
+        self._visible_indices = {node.index for node in previous_nodes}
+        self._visible_indices.update(node.index for node in next_nodes)
+        self._visible_indices.add(focus.index)
+        return previous_nodes, next_nodes
+
+    def _place_line(self, i: int, oTextControl: UnoControl,
+                    node: Optional[Node]):
+        """
+        Push the properties of the i-th line that differ from the last
+        rendered state: a property set is a repaint and an announcement
+        of the screen reader.
+        """
+        rendered = self._rendered[i]
+        if node is None:
+            if rendered is None or rendered[0]:
                 oTextControl.Visible = False
-            else:
-                oTextControl.Visible = True
-                oTextControl.Model.Label = self.tree.text(f)
+                self._rendered[i] = (
+                    False, None if rendered is None else rendered[1])
+            return
+
+        label = self.tree.text(node)
+        if rendered is None or not rendered[0]:
+            oTextControl.Visible = True
+        if rendered is None or rendered[1] != label:
+            oTextControl.Model.Label = label
+        self._rendered[i] = (True, label)
+
+
+class ListTreeHelper(ScrollTreeHelper):
+    """
+    Render the lines in a single list box rather than in one control per
+    line. The list box is fed a window of the tree around the focus and the
+    focus is the selected item: a redraw is one property update, and the
+    window may be resized without creating controls.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, root: Node, line_count: int, width: int, height: int,
+                 prefix: str = "list_tree",
+                 post: Callable[[Action], None] = post_to_main_thread):
+        super().__init__(root, line_count, width, height, prefix, post)
+        # the last items pushed to the list box
+        self._items = cast(Optional[Tuple[str, ...]], None)
+
+    def create_models(self, oDialogModel: UnoControlModel):
+        oListModel = oDialogModel.createInstance(
+            "com.sun.star.awt.UnoControlListBoxModel")
+        place_widget(oListModel, 0, 0, self.width,
+                     self.height * self.line_count)
+        oListModel.Name = self.prefix
+        oListModel.Tabstop = True
+        oListModel.FontName = "Liberation Mono"
+        oDialogModel.insertByName(self.prefix, oListModel)
+
+    def bind_controls(self, oDialogControl: UnoControl):
+        self._controls = [oDialogControl.getControl(self.prefix)]
+
+    def resize(self, oDialogControl: UnoControl, line_count: int):
+        """
+        Show `line_count` lines. The dialog fits the list box, otherwise the
+        lines below its height would be clipped.
+        """
+        self.line_count = line_count
+        oListControl = self._get_controls(oDialogControl)[0]
+        oListControl.Model.Height = self.height * line_count
+        oDialogControl.Model.Height = self.height * line_count
+        self.place_lines(oDialogControl)
+
+    def place_lines(self, oDialogControl: UnoControl):
+        controls = self._get_controls(oDialogControl)
+        if len(controls) == 0:
+            self._logger.warning("No list available!")
+            return
+
+        oListControl = controls[0]
+        base_index = self.line_count // 2
+        previous_nodes, next_nodes = self._get_window(
+            base_index, self.line_count - base_index - 1)
+        nodes = previous_nodes[::-1] + [self.tree.focus] + next_nodes
+        items = tuple(self.tree.text(node) for node in nodes)
+        selected_item = len(previous_nodes)
+        if items != self._items:
+            # the model sets the items before the selection
+            oListControl.Model.setPropertyValues(
+                ("SelectedItems", "StringItemList"),
+                ((selected_item,), items))
+        else:
+            # the list box moves its own selection on a key press: the
+            # selection is pushed again
+            oListControl.Model.SelectedItems = (selected_item,)
+        self._items = items
+        oListControl.setFocus()
 
 
 class AH4LODialogs:
     _logger = logging.getLogger(__name__)
 
-    def __init__(self, lo_lang: str):
+    def __init__(self, lo_lang: str, content_search: bool = True,
+                 list_mode: bool = False):
+        """
+        :param lo_lang: the language
+        :param content_search: if True, let the user search the content of
+        the document (Ctrl+F). The content is indexed in the background
+        from the first search
+        :param list_mode: if True, render the lines in a single list box
+        """
         self._ah4lo_lang = AH4LOLang.from_lang(lo_lang)
+        self._content_search = content_search
+        self._list_mode = list_mode
 
-    def create_calc_control(self, oDoc: UnoSpreadsheet):
+    def create_calc_control(self, oDoc: UnoSpreadsheet,
+                            cache: Optional[DocumentCache] = None):
         doc_title = oDoc.Title
         sheet_count = oDoc.Sheets.Count
         text = self._ah4lo_lang.calc_window_title(
@@ -162,13 +650,16 @@ class AH4LODialogs:
         oDialogModel.Title = text
         place_widget(oDialogModel, 100, 50, 500, 225)
 
-        root = CalcDocumentNodeFactory(self._ah4lo_lang, oDoc).get_root()
-        helper = ScrollTreeHelper(root, 15, 500, 15)
+        root = CalcDocumentNodeFactory(self._ah4lo_lang, oDoc,
+                                       cache).get_root()
+        helper = self._create_helper(root, cache, functools.partial(
+            get_calc_index_sections, self._ah4lo_lang, oDoc))
         helper.create_models(oDialogModel)
 
         oDialogControl = create_uno_service(Control.Dialog)
         oDialogControl.setModel(oDialogModel)
 
+        helper.bind_controls(oDialogControl)
         helper.add_keys(oDialogControl)
         helper.place_lines(oDialogControl)
 
@@ -176,9 +667,11 @@ class AH4LODialogs:
         toolkit = create_uno_service(
             "com.sun.star.awt.Toolkit")
         oDialogControl.createPeer(toolkit, None)
+        helper.start_loading(oDialogControl)
         return oDialogControl
 
-    def create_writer_control(self, oDoc: UnoSpreadsheet):
+    def create_writer_control(self, oDoc: UnoSpreadsheet,
+                              cache: Optional[DocumentCache] = None):
         doc_title = oDoc.Title
         page_count = extract_values(
             oDoc.DocumentProperties.DocumentStatistics,
@@ -190,13 +683,16 @@ class AH4LODialogs:
         oDialogModel.Title = text
         place_widget(oDialogModel, 100, 50, 500, 225)
 
-        root = WriterDocumentNodeFactory(self._ah4lo_lang, oDoc).get_root()
-        helper = ScrollTreeHelper(root, 15, 500, 15)
+        root = WriterDocumentNodeFactory(self._ah4lo_lang, oDoc,
+                                         cache).get_root()
+        helper = self._create_helper(root, cache, functools.partial(
+            get_writer_index_sections, self._ah4lo_lang, oDoc))
         helper.create_models(oDialogModel)
 
         oDialogControl = create_uno_service(Control.Dialog)
         oDialogControl.setModel(oDialogModel)
 
+        helper.bind_controls(oDialogControl)
         helper.add_keys(oDialogControl)
         helper.place_lines(oDialogControl)
 
@@ -204,4 +700,27 @@ class AH4LODialogs:
         toolkit = create_uno_service(
             "com.sun.star.awt.Toolkit")
         oDialogControl.createPeer(toolkit, None)
+        helper.start_loading(oDialogControl)
         return oDialogControl
+
+    def _create_helper(self, root: Node, cache: Optional[DocumentCache],
+                       get_sections: Callable[[], List[Section]]
+                       ) -> ScrollTreeHelper:
+        if self._list_mode:
+            helper = ListTreeHelper(root, 15, 500, 15)
+        else:
+            helper = ScrollTreeHelper(root, 15, 500, 15)
+        helper.search = self._create_search(root, cache, get_sections)
+        return helper
+
+    def _create_search(self, root: Node, cache: Optional[DocumentCache],
+                       get_sections: Callable[[], List[Section]]
+                       ) -> Optional[ContentSearch]:
+        if not self._content_search:
+            return None
+        if cache is None:
+            index = ContentIndex()
+        else:
+            index = cache.content_index
+        return ContentSearch(self._ah4lo_lang, index, root.store.resolver,
+                             get_sections)
@@ -23,6 +23,7 @@ class AH4LOLang:
     masked_word = "masked"
     protected_word = "protected"
     empty_word = "(Empty)"
+    mixed_word = "mixed"
     dialog_word = "dialogs"
     annotation_word = "annotation"
     chart_word = "chart"
@@ -47,6 +48,10 @@ class AH4LOLang:
     embedded_object_word = "embedded object"
     unknown_drawing_word = "unknown drawing"
 
+    search_word = "search"
+    result_word = "result"
+    partial_word = "partial"
+
     @staticmethod
     def from_lang(lang: str) -> "AH4LOLang":
         if lang == "fr":
@@ -90,12 +95,38 @@ class AH4LOLang:
     def columns(self, count: int) -> str:
         return _with_s(self.column_word, count).capitalize()
 
+    def columns_range(self, from_index: int, to_index: int) -> str:
+        if from_index == to_index:
+            return "{} {}".format(
+                self.column_word.capitalize(), from_index)
+        else:
+            return "{} {} {} {}".format(
+                self.column_word.capitalize() + "s",
+                from_index, self.to_word, to_index)
+
+    def column(self, column_name: str, type_id: int,
+               mixed: bool = False) -> str:
+        value = "{} {}".format(column_name, self.get_type_name(type_id))
+        if mixed:
+            value += " ({})".format(self.mixed_word)
+        return value
+
+    def control(self, name: str, label: str) -> str:
+        return "{}, {}".format(name, label)
+
+    def sheet_column(self, sheet_name: str, column: str) -> str:
+        return "{} {}, {} {}".format(self.sheet_word.capitalize(), sheet_name,
+                                     self.column_word, column)
+
     def dialogs(self, count: int) -> str:
         return _with_s(self.dialog_word, count).capitalize()
 
     def annotations(self, count: int) -> str:
         return _with_s(self.annotation_word, count).capitalize()
 
+    def annotation(self, text: str, addresses: str) -> str:
+        return "'{}' : {}".format(text, addresses)
+
     def charts(self, count: int) -> str:
         return _with_s(self.chart_word, count).capitalize()
 
@@ -200,6 +231,25 @@ class AH4LOLang:
         return "{}: {}".format(
             self.unknown_drawing_word.capitalize(), name)
 
+    def search_prompt(self, query: str) -> str:
+        return "{}: {}".format(self.search_word.capitalize(), query)
+
+    def search_results(self, query: str, count: int, partial: bool) -> str:
+        value = "{} '{}': {}".format(
+            self.search_word.capitalize(), query,
+            _with_s(self.result_word, count))
+        if partial:
+            value += " ({})".format(self.partial_word)
+        return value
+
+    def results_range(self, from_index: int, to_index: int) -> str:
+        if from_index == to_index:
+            return "{} {}".format(self.result_word.capitalize(), from_index)
+        else:
+            return "{} {} {} {}".format(
+                self.result_word.capitalize() + "s",
+                from_index, self.to_word, to_index)
+
 
 class AH4LOLangEn(AH4LOLang):
     pass
@@ -241,6 +291,11 @@ class AH4LOLangFr(AH4LOLang):
     embedded_object_word = "objet embarqué"
     unknown_drawing_word = "dessin inconnu"
 
+    search_word = "recherche"
+    result_word = "résultat"
+    partial_word = "partiel"
+    mixed_word = "mixte"
+
     def dynamic_tables(self, count: int) -> str:
         return _plural(
             self.dynamic_table_word, self.dynamic_tables_word, count
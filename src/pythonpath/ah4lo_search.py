@@ -0,0 +1,229 @@
+import collections
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple, Union, cast
+
+from ah4lo_tree import ActionDescriptor, Label, Worker
+
+# a place where a text was found: the label of the result node and the
+# action that goes there
+Target = Tuple[Union[str, Label], ActionDescriptor]
+# a chunk of (label, action, text) read from the document
+Chunk = List[Tuple[Union[str, Label], ActionDescriptor, str]]
+# a section name and a function that reads the section chunk by chunk
+Section = Tuple[str, Callable[[], Iterable[Chunk]]]
+
+# max number of (word, target) pairs in an index
+MAX_POSTING_COUNT = 500000
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    :param text: a text
+    :return: the casefolded words of the text
+    """
+    return _WORD_PATTERN.findall(text.casefold())
+
+
+class ContentSegment:
+    """
+    The inverted index of a section (a sheet, the content of a Writer
+    document): every word points to the targets where it was found.
+    """
+
+    def __init__(self):
+        self.targets = cast(List[Target], [])
+        self.complete = False
+        self._target_id_by_action = cast(Dict[ActionDescriptor, int], {})
+        self._target_ids_by_word = cast(Dict[str, List[int]], {})
+        self.posting_count = 0
+
+    def add(self, value: Union[str, Label], action: ActionDescriptor,
+            text: str) -> int:
+        """
+        :return: the number of new postings
+        """
+        try:
+            target_id = self._target_id_by_action[action]
+        except KeyError:
+            target_id = len(self.targets)
+            self.targets.append((value, action))
+            self._target_id_by_action[action] = target_id
+
+        count = 0
+        for word in tokenize(text):
+            target_ids = self._target_ids_by_word.setdefault(word, [])
+            # a target is added chunk by chunk: a word is stored once per
+            # chunk at most, and the search removes the duplicates
+            if not target_ids or target_ids[-1] != target_id:
+                target_ids.append(target_id)
+                count += 1
+        self.posting_count += count
+        return count
+
+    def search(self, words: List[str]) -> List[Target]:
+        """
+        :param words: the words
+        :return: the targets that contain all the words
+        """
+        found = None
+        for word in words:
+            target_ids = self._target_ids_by_word.get(word)
+            if target_ids is None:
+                return []
+            if found is None:
+                found = set(target_ids)
+            else:
+                found.intersection_update(target_ids)
+        if not found:
+            return []
+        return [self.targets[target_id] for target_id in sorted(found)]
+
+
+class ContentIndex:
+    """
+    A full-text index of a document, made of one segment per section.
+    When the index holds more than `max_posting_count` postings, the least
+    recently updated segments are evicted. A segment is also evicted when
+    its section is modified (see `DocumentCache.invalidate`).
+
+    The index is filled by a `ContentIndexer` thread and searched by the
+    UI thread.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, max_posting_count: int = MAX_POSTING_COUNT):
+        self.max_posting_count = max_posting_count
+        self.posting_count = 0
+        # some segments were evicted or truncated
+        self.partial = False
+        self._segment_by_section = cast(
+            "collections.OrderedDict[str, ContentSegment]",
+            collections.OrderedDict())
+        self._lock = threading.RLock()
+
+    def is_indexed(self, section: str) -> bool:
+        with self._lock:
+            segment = self._segment_by_section.get(section)
+            return segment is not None and segment.complete
+
+    def start_segment(self, section: str):
+        with self._lock:
+            self.evict(section)
+            self._segment_by_section[section] = ContentSegment()
+
+    def add_chunk(self, section: str, chunk: Chunk) -> bool:
+        """
+        :return: False if the segment was evicted or is full
+        """
+        with self._lock:
+            segment = self._segment_by_section.get(section)
+            if segment is None:
+                return False
+            for value, action, text in chunk:
+                self.posting_count += segment.add(value, action, text)
+            self._segment_by_section.move_to_end(section)
+            return self._shrink(section)
+
+    def complete_segment(self, section: str):
+        with self._lock:
+            segment = self._segment_by_section.get(section)
+            if segment is not None:
+                segment.complete = True
+
+    def evict(self, section: str):
+        with self._lock:
+            segment = self._segment_by_section.pop(section, None)
+            if segment is not None:
+                self.posting_count -= segment.posting_count
+
+    def clear(self):
+        with self._lock:
+            self._segment_by_section.clear()
+            self.posting_count = 0
+            self.partial = False
+
+    def _shrink(self, section: str) -> bool:
+        """
+        Evict the least recently updated segments. If the segment of the
+        section is alone and still too big, it is truncated.
+
+        :return: False if the segment is full
+        """
+        while (self.posting_count > self.max_posting_count
+               and len(self._segment_by_section) > 1):
+            # the segment of the section was moved to the end
+            oldest = next(iter(self._segment_by_section))
+            self._logger.debug("Evict segment %s", oldest)
+            self.partial = True
+            self.evict(oldest)
+        if self.posting_count > self.max_posting_count:
+            self.partial = True
+            # do not index it again
+            self._segment_by_section[section].complete = True
+            return False
+        return True
+
+    def search(self, query: str) -> List[Target]:
+        """
+        :param query: some words
+        :return: the targets that contain all the words, section by section
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            targets = []
+            for segment in self._segment_by_section.values():
+                targets.extend(segment.search(words))
+            return targets
+
+
+class ContentIndexer(Worker):
+    """
+    Fill a content index in a worker thread, section by section. The
+    sections that are already indexed are skipped.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, index: ContentIndex, sections: Iterable[Section],
+                 pause: float = 0.01):
+        """
+        :param index: the index
+        :param sections: the sections of the document
+        :param pause: the time the worker sleeps between two chunks
+        """
+        super().__init__(pause)
+        self.index = index
+        self.sections = sections
+
+    def _run(self):
+        self._logger.debug("Indexing started")
+        for section, read in self.sections:
+            if self._cancelled.is_set():
+                break
+            if self.index.is_indexed(section):
+                continue
+            try:
+                self._index_section(section, read)
+            except Exception:
+                self._logger.exception("Index %s", section)
+                self.index.evict(section)
+        self._logger.debug("Indexing stopped")
+
+    def _index_section(self, section: str,
+                       read: Callable[[], Iterable[Chunk]]):
+        self.index.start_segment(section)
+        for chunk in read():
+            if self._cancelled.is_set():
+                self.index.evict(section)
+                return
+            if not self.index.add_chunk(section, chunk):
+                self._logger.debug("Segment %s is full", section)
+                return
+            time.sleep(self.pause)
+        self.index.complete_segment(section)
@@ -1,81 +1,418 @@
+import bisect
 import logging
-from typing import List, Optional, cast, Callable, Iterable
+import sys
+import threading
+import time
+from array import array
+from typing import (List, Optional, cast, Callable, Iterable, Dict,
+                    Union, Tuple, Any)
+
+Action = Callable[[], None]
+# a kind of action followed by plain arguments, see `TreeStore.resolver`
+ActionDescriptor = Tuple[Any, ...]
+Resolver = Callable[[ActionDescriptor], None]
+Loader = Callable[[], Iterable["NodeBuilder"]]
+
+NO_NODE = -1
+
+
+class Label:
+    """
+    A label that is formatted when the node is first displayed.
+    """
+    __slots__ = ("formatter", "args")
+
+    def __init__(self, formatter: Callable[..., str], *args):
+        self.formatter = formatter
+        self.args = args
+
+    def __str__(self) -> str:
+        return self.formatter(*self.args)
+
+    def __repr__(self) -> str:
+        return "Label({}, {})".format(self.formatter, self.args)
+
+
+class TreeStore:
+    """
+    A frozen tree stored as parallel arrays: the node `i` is described by
+    the i-th item of every array. Nodes are appended in preorder when the
+    tree is frozen, and lazily loaded children are appended at the end.
+
+    `followings` and `precedings` hold the nodes returned by `Node.next()`
+    and `Node.previous()`, that is the lines below and above a node when
+    the siblings of the focus and of its ancestors are displayed.
+
+    The nodes appended at once (the initial tree or the children returned
+    by a loader) form a block. Inside a block, the descendants of `i` are
+    the nodes `i + 1` to `exits[i]`. A block is attached to the node whose
+    loader created it (`block_owners`). A block is linked to its owner once
+    indexed: the other threads never see a partial block.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self):
+        self.parents = array("i")
+        self.first_children = array("i")
+        self.next_siblings = array("i")
+        self.previous_siblings = array("i")
+        self.levels = array("i")
+        self.followings = array("i")
+        self.precedings = array("i")
+        self.exits = array("i")
+        self.blocks = array("i")
+        self.block_owners = array("i")
+        # a label is either a string or a `Label` formatted on first display
+        self.labels = cast(List[Union[str, Label]], [])
+        self.actions = cast(Dict[int, Union[Action, ActionDescriptor]], {})
+        self.loaders = cast(Dict[int, Loader], {})
+        # executes the action descriptors against the document
+        self.resolver = cast(Optional[Resolver], None)
+        # the node to load before the others, see `request_load`
+        self._requested = NO_NODE
+        # the number of nodes in the linked blocks
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def node(self, index: int) -> Optional["Node"]:
+        if index == NO_NODE:
+            return None
+        return Node(self, index)
+
+    def add_root(self, builder: "NodeBuilder") -> int:
+        index = self._append(builder, NO_NODE, 0)
+        first_child = self._add_children(index, builder.children)
+        self._index_block(index, NO_NODE)
+        self.first_children[index] = first_child
+        self._size = len(self.levels)
+        return index
+
+    def children(self, index: int) -> List[int]:
+        indices = []
+        child = self.first_children[index]
+        while child != NO_NODE:
+            indices.append(child)
+            child = self.next_siblings[child]
+        return indices
+
+    def load(self, index: int, blocking: bool = True) -> bool:
+        """
+        Run the loader of a node, if any, and append the children it
+        returns. The loader is run only once, even if it fails.
+
+        This method may be called from several threads: the loader is
+        removed once the children are appended, hence a node is either
+        loaded or has a loader.
+
+        :param index: the node index
+        :param blocking: if False and another thread is loading a node,
+        return immediately. The UI thread must not wait for a worker that
+        may itself wait for the UI thread.
+        :return: False if the store was busy
+        """
+        if index not in self.loaders:
+            # already loaded: the store may be busy with another node
+            return True
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            loader = self.loaders.get(index)
+            if loader is None:
+                return True
+            self._logger.debug("Load children of %s", self.labels[index])
+            try:
+                children = list(loader())
+            except Exception:
+                self._logger.exception("Loader")
+                children = []
+            start = len(self.levels)
+            first_child = self._add_children(index, children)
+            self._index_block(start, index)
+            # link the block: the node has children or a loader
+            self.first_children[index] = first_child
+            self._size = len(self.levels)
+            del self.loaders[index]
+            return True
+        finally:
+            self._lock.release()
+
+    def request_load(self, index: int):
+        """
+        Ask the worker that runs the pending loaders to load this node next.
+        """
+        self._requested = index
+
+    def pending_loader(self) -> int:
+        """
+        :return: the requested node if it still has a loader, else the first
+        node, in insertion order, that still has a loader, or NO_NODE
+        """
+        with self._lock:
+            requested = self._requested
+            self._requested = NO_NODE
+            if requested in self.loaders:
+                return requested
+            return next(iter(self.loaders), NO_NODE)
+
+    def is_ancestor(self, ancestor: int, index: int) -> bool:
+        """
+        :return: True if `ancestor` is a strict ancestor of `index`. The cost
+        depends on the number of nested loaded blocks, not on the depth.
+        """
+        block = self.blocks[ancestor]
+        lower = ancestor + 1
+        while self.blocks[index] != block:
+            index = self.block_owners[self.blocks[index]]
+            if index == NO_NODE:
+                return False
+            lower = ancestor
+        return lower <= index <= self.exits[ancestor]
+
+    def previous_indices(self, index: int, count: int) -> List[int]:
+        """
+        :return: at most `count` indices of the lines above `index`, nearest
+        first
+        """
+        indices = []
+        precedings = self.precedings
+        index = precedings[index]
+        while index != NO_NODE and len(indices) < count:
+            indices.append(index)
+            index = precedings[index]
+        return indices
+
+    def next_indices(self, index: int, count: int) -> List[int]:
+        """
+        :return: at most `count` indices of the lines below `index`, nearest
+        first
+        """
+        indices = []
+        followings = self.followings
+        index = followings[index]
+        while index != NO_NODE and len(indices) < count:
+            indices.append(index)
+            index = followings[index]
+        return indices
+
+    def _add_children(self, parent: int, children: List["NodeBuilder"]
+                      ) -> int:
+        """
+        Append the descendants of a frozen node in preorder, without
+        recursion. The parent is not linked to its first child.
+
+        :return: the index of the first child or NO_NODE
+        """
+        top = parent
+        first_child = NO_NODE
+        # stack of (parent index, iterator over the builders, last child)
+        stack = [(parent, iter(children), NO_NODE)]
+        while stack:
+            parent, it, previous = stack[-1]
+            builder = next(it, None)
+            if builder is None:
+                stack.pop()
+                continue
+            index = self._append(builder, parent, self.levels[parent] + 1)
+            if previous == NO_NODE:
+                if parent == top:
+                    first_child = index
+                else:
+                    self.first_children[parent] = index
+            else:
+                self.next_siblings[previous] = index
+            self.previous_siblings[index] = previous
+            stack[-1] = (parent, it, index)
+            if builder.children:
+                stack.append((index, iter(builder.children), NO_NODE))
+        return first_child
+
+    def _index_block(self, start: int, owner: int):
+        end = len(self.levels)
+        block = len(self.block_owners)
+        self.block_owners.append(owner)
+        # a parent always precedes its children
+        for index in range(start, end):
+            parent = self.parents[index]
+            previous = self.previous_siblings[index]
+            self.precedings.append(parent if previous == NO_NODE else previous)
+            following = self.next_siblings[index]
+            if following == NO_NODE and parent != NO_NODE:
+                following = self.followings[parent]
+            self.followings.append(following)
+            self.exits.append(index)
+            self.blocks.append(block)
+
+        for index in range(end - 1, start - 1, -1):
+            parent = self.parents[index]
+            if parent >= start and self.exits[parent] < self.exits[index]:
+                self.exits[parent] = self.exits[index]
+
+    def _append(self, builder: "NodeBuilder", parent: int, level: int
+                ) -> int:
+        index = len(self.levels)
+        self.parents.append(parent)
+        self.first_children.append(NO_NODE)
+        self.next_siblings.append(NO_NODE)
+        self.previous_siblings.append(NO_NODE)
+        self.levels.append(level)
+        value = builder.value
+        if isinstance(value, str):
+            value = sys.intern(value)
+        self.labels.append(value)
+        if builder.action is not None:
+            self.actions[index] = builder.action
+        if builder.loader is not None:
+            if builder.children:
+                raise ValueError("A node has either children or a loader")
+            self.loaders[index] = builder.loader
+        return index
 
 
 class Node:
+    """
+    A view on a node of a `TreeStore`.
+    """
+    __slots__ = ("store", "index")
     _logger = logging.getLogger()
 
-    def __init__(self, value: str,
-                 action: Optional[Callable[[], None]],
-                 children: List["Node"], parent: Optional["Node"], level: int,
-                 previous_sibling: Optional["Node"],
-                 next_sibling: Optional["Node"]):
-        self.value = value
-        self.action = action
-        self.children = children
-        self.parent = parent
-        self.level = level
-        self.previous_sibling = previous_sibling
-        self.next_sibling = next_sibling
+    def __init__(self, store: TreeStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def value(self) -> str:
+        value = self.store.labels[self.index]
+        if isinstance(value, Label):
+            value = sys.intern(str(value))
+            self.store.labels[self.index] = value
+        return value
+
+    @property
+    def action(self) -> Optional[Union[Action, ActionDescriptor]]:
+        return self.store.actions.get(self.index)
+
+    @property
+    def loader(self) -> Optional[Loader]:
+        return self.store.loaders.get(self.index)
+
+    @property
+    def first_child(self) -> Optional["Node"]:
+        return self.store.node(self.store.first_children[self.index])
+
+    @property
+    def children(self) -> List["Node"]:
+        return [Node(self.store, i) for i in self.store.children(self.index)]
+
+    @property
+    def parent(self) -> Optional["Node"]:
+        return self.store.node(self.store.parents[self.index])
+
+    @property
+    def level(self) -> int:
+        return self.store.levels[self.index]
+
+    @property
+    def previous_sibling(self) -> Optional["Node"]:
+        return self.store.node(self.store.previous_siblings[self.index])
+
+    @property
+    def next_sibling(self) -> Optional["Node"]:
+        return self.store.node(self.store.next_siblings[self.index])
 
     def execute(self):
-        if self.action is not None:
+        action = self.action
+        if action is not None:
             self._logger.debug("Execute action")
             try:
-                self.action()
+                if isinstance(action, tuple):
+                    if self.store.resolver is None:
+                        self._logger.warning("No resolver for %s", action)
+                    else:
+                        self.store.resolver(action)
+                else:
+                    action()
             except Exception:
                 self._logger.exception("Action")
             self._logger.debug("Action executed")
 
+    def has_children(self) -> bool:
+        """
+        :return: True if the node has children or may have children once
+        loaded. The loader is not run.
+        """
+        return (self.store.first_children[self.index] != NO_NODE
+                or self.index in self.store.loaders)
+
+    def load(self, blocking: bool = True) -> bool:
+        """
+        Run the loader, if any, and append the children it returns.
+
+        :return: False if the store was busy, see `TreeStore.load`
+        """
+        return self.store.load(self.index, blocking)
+
     def previous(self) -> Optional["Node"]:
-        n = self.previous_sibling
-        if n is None:
-            if self.parent is None:
-                return None
-            else:
-                return self.parent
-        return n
+        return self.store.node(self.store.precedings[self.index])
 
     def next(self) -> Optional["Node"]:
-        n = self
-        while n is not None:
-            if n.next_sibling:
-                return n.next_sibling
-            else:
-                n = n.parent
-        return None
+        return self.store.node(self.store.followings[self.index])
+
+    def previous_nodes(self, count: int) -> List["Node"]:
+        """
+        :return: at most `count` nodes above this one, nearest first
+        """
+        return [Node(self.store, i)
+                for i in self.store.previous_indices(self.index, count)]
+
+    def next_nodes(self, count: int) -> List["Node"]:
+        """
+        :return: at most `count` nodes below this one, nearest first
+        """
+        return [Node(self.store, i)
+                for i in self.store.next_indices(self.index, count)]
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, Node) and self.store is other.store
+                and self.index == other.index)
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), self.index))
 
     @staticmethod
-    def _short_repr(node: "Node") -> str:
+    def _short_repr(node: Optional["Node"]) -> str:
         if node is None:
             return "None"
         else:
-            return "{}-{}".format(id(node), node.value)
+            return "{}-{}".format(node.index, node.value)
 
     def __repr__(self) -> str:
-        return ("Node(id={}, value={}, action={}, "
+        return ("Node(index={}, value={}, action={}, "
                 "children={}, parent={}, level={}, previous_sibling={},"
                 "next_sibling={})").format(
-            id(self), self.value, self.action,
+            self.index, self.value, self.action,
             [Node._short_repr(c) for c in self.children],
             Node._short_repr(self.parent), self.level,
             Node._short_repr(self.previous_sibling),
             Node._short_repr(self.next_sibling))
 
 
-Action = Callable[[], None]
-
-
 class NodeBuilder:
-    def __init__(self, value: str,
-                 action: Optional[Action] = None):
+    """
+    A mutable node. The children are either appended before the tree is
+    frozen or returned by the `loader` when the frozen node is first
+    entered, but not both.
+    """
+
+    def __init__(self, value: Union[str, Label],
+                 action: Optional[Union[Action, ActionDescriptor]] = None,
+                 loader: Optional[Loader] = None):
         self.value = value
         self.action = action
+        self.loader = loader
         self.children = cast(List[NodeBuilder], [])
-        self.parent = cast(Optional[NodeBuilder], None)
-        self.level = -1
-        self.previous_sibling = cast(Optional[NodeBuilder], None)
-        self.next_sibling = cast(Optional[NodeBuilder], None)
 
     def append_child(self, node: "NodeBuilder"):
         self.children.append(node)
@@ -83,24 +420,14 @@ class NodeBuilder:
     def extend_children(self, nodes: Iterable["NodeBuilder"]):
         self.children.extend(nodes)
 
-    def freeze_as_root(self):
-        self.level = 0
-        self._freeze()
-
-    def _freeze(self):
-        self.__class__ = Node
-        for i, c in enumerate(self.children):
-            c.parent = self
-            c.level = self.level + 1
-            if i > 0:
-                c.previous_sibling = self.children[i - 1]
-            else:
-                c.previous_sibling = None
-            if i < len(self.children) - 1:
-                c.next_sibling = self.children[i + 1]
-            else:
-                c.next_sibling = None
-            c._freeze()
+    def freeze_as_root(self) -> Node:
+        """
+        Copy this node and its descendants to a new `TreeStore`.
+
+        :return: the root node.
+        """
+        store = TreeStore()
+        return Node(store, store.add_root(self))
 
     def execute(self):
         raise ValueError()
@@ -118,12 +445,165 @@ class NodeBuilder:
             [NodeBuilder._short_repr(c) for c in self.children])
 
 
+class LabelIndex:
+    """
+    A sorted index of the labels of a store, to find the nodes whose label
+    starts with a prefix. The index is built on first use, since it formats
+    every label, and extended with the nodes loaded since the last lookup.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, store: TreeStore):
+        self.store = store
+        # (casefolded label, index), sorted
+        self._entries = cast(List[Tuple[str, int]], [])
+        # the casefolded label of each node
+        self._keys = cast(List[str], [])
+
+    def _update(self):
+        # the nodes of a block being loaded are not indexed yet
+        count = len(self.store)
+        indexed_count = len(self._keys)
+        if count == indexed_count:
+            return
+        start = time.perf_counter()
+        labels = self.store.labels
+        # a label is formatted but not cached: the store keeps the `Label`
+        new_keys = [str(labels[i]).strip().casefold()
+                    for i in range(indexed_count, count)]
+        self._keys.extend(new_keys)
+        # sorted() merges the runs in linear time
+        self._entries = sorted(self._entries + sorted(
+            zip(new_keys, range(indexed_count, count))))
+        self._logger.debug("Index %s labels in %.1f ms", len(new_keys),
+                           (time.perf_counter() - start) * 1000)
+
+    def find(self, prefix: str, after: int = NO_NODE) -> Optional[Node]:
+        """
+        :param prefix: the beginning of the label, case insensitive
+        :param after: the index of a node
+        :return: the first node after `after` whose label starts with the
+        prefix, or the first node if there is no such node after `after`.
+        """
+        self._update()
+        key = prefix.casefold()
+        lo = bisect.bisect_left(self._entries, (key,))
+        if key:
+            end_key = key[:-1] + chr(ord(key[-1]) + 1)
+            hi = bisect.bisect_left(self._entries, (end_key,), lo)
+        else:
+            hi = len(self._entries)
+        if lo == hi:
+            return None
+
+        if (hi - lo) * (hi - lo) > len(self._keys):
+            # many matches: one is close to `after`
+            index = self._scan(key, after)
+        else:
+            index = self._min_after(lo, hi, after)
+        return self.store.node(index)
+
+    def _scan(self, key: str, after: int) -> int:
+        keys = self._keys
+        for index in range(after + 1, len(keys)):
+            if keys[index].startswith(key):
+                return index
+        for index in range(0, after + 1):
+            if keys[index].startswith(key):
+                return index
+        return NO_NODE
+
+    def _min_after(self, lo: int, hi: int, after: int) -> int:
+        first = NO_NODE
+        best = NO_NODE
+        for _key, index in self._entries[lo:hi]:
+            if first == NO_NODE or index < first:
+                first = index
+            if index > after and (best == NO_NODE or index < best):
+                best = index
+        if best == NO_NODE:
+            return first
+        return best
+
+
+class Worker:
+    """
+    A job that runs once in a daemon thread and can be cancelled. The
+    subclasses implement `_run` and check `_cancelled` between two steps.
+    """
+
+    def __init__(self, pause: float = 0.01):
+        """
+        :param pause: the time the worker sleeps between two steps, to let
+        the UI thread process the events
+        """
+        self.pause = pause
+        self._cancelled = threading.Event()
+        self._thread = cast(Optional[threading.Thread], None)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """
+        Stop after the current step.
+        """
+        self._cancelled.set()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        raise NotImplementedError
+
+
+class BackgroundLoader(Worker):
+    """
+    Run the pending loaders of a store in a worker thread, top-down, while
+    the user navigates the nodes that are already loaded. If cancelled, the
+    remaining nodes will be loaded on demand.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, store: TreeStore,
+                 on_loaded: Optional[Callable[[int], None]] = None,
+                 pause: float = 0.01):
+        """
+        :param store: the store
+        :param on_loaded: called with the index of every loaded node
+        :param pause: the time the worker sleeps between two loaders
+        """
+        super().__init__(pause)
+        self.store = store
+        self.on_loaded = on_loaded
+
+    def _run(self):
+        self._logger.debug("Background loading started")
+        while not self._cancelled.is_set():
+            index = self.store.pending_loader()
+            if index == NO_NODE:
+                break
+            self.store.load(index)
+            if self.on_loaded is not None and not self._cancelled.is_set():
+                try:
+                    self.on_loaded(index)
+                except Exception:
+                    self._logger.exception("On loaded")
+            time.sleep(self.pause)
+        self._logger.debug("Background loading stopped")
+
+
 class Tree:
     _logger = logging.getLogger(__name__)
 
     def __init__(self, root: Node):
         self.root = root
         self.focus = root
+        # the node to enter once loaded, see `left`
+        self._entering = NO_NODE
+        self._indent_by_level_delta = cast(Dict[int, str], {})
 
     def down(self):
         sibling = self.focus.next_sibling
@@ -141,27 +621,62 @@ class Tree:
             self.focus = parent
 
     def left(self):
-        children = self.focus.children
-        if children:
-            self.focus = children[0]
+        """
+        Enter the focus. If a worker is loading a node, the focus stays where
+        it is: the worker loads it next, and `resume` enters it.
+        """
+        focus = self.focus
+        if not focus.load(False):
+            self._entering = focus.index
+            focus.store.request_load(focus.index)
+            return
+        self._entering = NO_NODE
+        child = focus.first_child
+        if child:
+            self.focus = child
+
+    def resume(self) -> bool:
+        """
+        Enter the node that was busy when `left` was called, if it is
+        loaded and still the focus.
+
+        :return: True if the focus moved
+        """
+        focus = self.focus
+        if self._entering != focus.index or focus.loader is not None:
+            return False
+        self._entering = NO_NODE
+        child = focus.first_child
+        if child:
+            self.focus = child
+            return True
+        return False
 
     def enter(self):
         self.focus.execute()
 
+    def goto(self, node: Node):
+        self.focus = node
+
     def text(self, node: Node) -> str:
-        s = "+"
-        cur = self.focus.parent
-        while cur is not None:
-            if cur == node:
-                s = "-"
-            cur = cur.parent
-        space_count = (8 + node.level - self.focus.level) * 4
-        value = space_count * " " + str(
+        if node.store.is_ancestor(node.index, self.focus.index):
+            s = "-"
+        else:
+            s = "+"
+        value = self._indent(node.level - self.focus.level) + str(
             node.value)
-        if node.children:
+        if node.has_children():
             value += " " + s
         return value
 
+    def _indent(self, level_delta: int) -> str:
+        try:
+            return self._indent_by_level_delta[level_delta]
+        except KeyError:
+            indent = (8 + level_delta) * 4 * " "
+            self._indent_by_level_delta[level_delta] = indent
+            return indent
+
     def home(self):
         sibling = self.focus.previous_sibling
         while sibling:
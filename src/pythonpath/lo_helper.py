@@ -1,5 +1,7 @@
 import collections
-from typing import List, Any, Iterable
+import itertools
+import logging
+from typing import List, Any, Iterable, Sequence, Tuple, Optional, cast
 
 try:
     # noinspection PyUnresolvedReferences
@@ -7,8 +9,14 @@ try:
 except (ModuleNotFoundError, ImportError):
     from mock_constants import NumberFormat
 
-from py4lo_helper import create_uno_service, make_pv
-from py4lo_typing import UnoRange
+try:
+    # NumPy is not shipped with every LibreOffice bundled interpreter
+    import numpy as np
+except ImportError:
+    np = None
+
+from py4lo_helper import create_uno_service, make_pv, to_iter
+from py4lo_typing import UnoRange, UnoService
 
 
 def get_lang() -> str:
@@ -23,59 +31,437 @@ def get_lang() -> str:
     return oSetupL10N.getByName("ooLocale")
 
 
-def guess_format_id(oRange: UnoRange) -> int:
-    if oRange is None:
-        return 0
-    if oRange.NumberFormat != 0:
-        return oRange.NumberFormat
+# number of rows read to guess the type of the columns
+SAMPLE_ROW_COUNT = 1000
+# number of windows of a tall range: head, middle chunks and tail
+SAMPLE_WINDOW_COUNT = 5
+# number of non empty cells per column whose format is counted
+FORMAT_SAMPLE_COUNT = 100
+
+Window = Tuple[int, int]
+
+
+def sample_windows(row_count: int, budget: int = SAMPLE_ROW_COUNT,
+                   window_count: int = SAMPLE_WINDOW_COUNT) -> List[Window]:
+    """
+    :param row_count: the number of rows of the range
+    :param budget: the maximum number of rows to read
+    :param window_count: the number of windows if the range is taller than
+    the budget
+    :return: the windows (start row, end row excluded), that is the whole
+    range or `window_count` evenly spaced windows from the head to the tail.
+    """
+    if row_count <= 0:
+        return []
+    if row_count <= budget:
+        return [(0, row_count)]
+
+    size = max(1, budget // window_count)
+    last_start = row_count - size
+    return [(start, start + size)
+            for start in sorted({last_start * i // (window_count - 1)
+                                 for i in range(window_count)})]
+
+
+class RangeSample:
+    """
+    The values and the number format ids of some rows of a range.
+    """
+
+    def __init__(self, values: Sequence[Sequence[Any]],
+                 format_ids: Sequence[Sequence[int]]):
+        self.values = values
+        self.format_ids = format_ids
+
+
+def fetch_sample(oRange: UnoRange, windows: Sequence[Window],
+                 column_count: Optional[int] = None) -> RangeSample:
+    """
+    Read some rows of a range with one `DataArray` call and one enumeration
+    of the unique cell format ranges per window.
 
+    :param oRange: the range
+    :param windows: the windows of rows (start row, end row excluded),
+    relative to the range
+    :param column_count: the number of columns to read, default is all
+    :return: the sample, whose rows are the rows of the windows
+    """
     oRangeAddress = oRange.RangeAddress
-    row_count = min(1000, oRangeAddress.EndRow - oRangeAddress.StartRow + 1)
+    if column_count is None:
+        column_count = (oRangeAddress.EndColumn - oRangeAddress.StartColumn
+                        + 1)
+    values = []
+    format_ids_list = []
+    for start_row, end_row in windows:
+        oWindow = oRange.getCellRangeByPosition(
+            0, start_row, column_count - 1, end_row - 1)
+        values.extend(oWindow.DataArray)
+        format_ids_list.append(_fetch_format_ids(
+            oWindow, end_row - start_row, column_count,
+            oRangeAddress.StartRow + start_row, oRangeAddress.StartColumn))
+
+    if np is None:
+        format_ids = list(itertools.chain.from_iterable(format_ids_list))
+    elif format_ids_list:
+        format_ids = np.concatenate(format_ids_list)
+    else:
+        format_ids = np.zeros((0, column_count), dtype=np.int64)
+    return RangeSample(values, format_ids)
+
+
+def _fetch_format_ids(oWindow: UnoRange, row_count: int, column_count: int,
+                      start_row: int, start_column: int):
+    if np is None:
+        format_ids = [[0] * column_count for _ in range(row_count)]
+    else:
+        format_ids = np.zeros((row_count, column_count), dtype=np.int64)
+    for oRanges in to_iter(oWindow.UniqueCellFormatRanges):
+        format_id = oRanges.NumberFormat
+        if format_id == 0:
+            continue
+        for oAddress in oRanges.RangeAddresses:
+            _fill_format_ids(
+                format_ids, format_id,
+                oAddress.StartRow - start_row,
+                oAddress.StartColumn - start_column,
+                oAddress.EndRow - start_row + 1,
+                oAddress.EndColumn - start_column + 1)
+    return format_ids
 
-    oLimitedRange = oRange.getCellRangeByPosition(0, 0, 0, row_count - 1)
-    data_array = oLimitedRange.DataArray
+
+def _fill_format_ids(format_ids, format_id: int, start_row: int,
+                     start_column: int, end_row: int, end_column: int):
+    if np is None:
+        for r in range(start_row, end_row):
+            format_ids[r][start_column:end_column] = (
+                    [format_id] * (end_column - start_column))
+    else:
+        format_ids[start_row:end_row, start_column:end_column] = format_id
+
+
+def guess_format_ids(values: Sequence[Sequence[Any]],
+                     format_ids: Sequence[Sequence[int]]) -> List[int]:
+    """
+    Guess the format of every column of a sample.
+
+    :param values: the rows of values, as returned by `DataArray`
+    :param format_ids: the rows of number format ids
+    :return: the format id of each column, -1 for text
+    """
+    return [format_id for format_id, _ in guess_formats(values, format_ids)]
+
+
+def guess_formats(values: Sequence[Sequence[Any]],
+                  format_ids: Sequence[Sequence[int]]
+                  ) -> List[Tuple[int, float]]:
+    """
+    Guess the format of every column of a sample.
+
+    :param values: the rows of values, as returned by `DataArray`
+    :param format_ids: the rows of number format ids
+    :return: the format id of each column (-1 for text) and the share of
+    the non empty cells that match this format
+    """
+    if len(values) == 0:
+        return []
+    if np is not None:
+        return _guess_formats_np(values, format_ids)
+    return [_guess_column_format([row[c] for row in values],
+                                 [row[c] for row in format_ids])
+            for c in range(len(values[0]))]
+
+
+def _guess_column_format(values: Sequence[Any],
+                         format_ids: Sequence[int]) -> Tuple[int, float]:
+    first_format_id = format_ids[0]
+    if first_format_id != 0 and all(
+            format_id == first_format_id for format_id in format_ids):
+        return first_format_id, 1.0
 
     non_empty_indices = [
         r
-        for r, row in enumerate(data_array)
-        if isinstance(row[0], float) or row[0]
+        for r, v in enumerate(values)
+        if isinstance(v, float) or v
     ]
+    if not non_empty_indices:
+        return 0, 0.0
 
-    # essaie le format texte sur 1000 lignes ou moins
     float_count = 0
     text_count = 0
     for r in non_empty_indices:
-        v = data_array[r][0]
-        if isinstance(v, str):
+        if isinstance(values[r], str):
             text_count += 1
         else:
             float_count += 1
-    if text_count > float_count:  # plus de texte que de numérique
-        return -1
+    if text_count > float_count:
+        return -1, text_count / len(non_empty_indices)
+
+    counted_indices = non_empty_indices[:FORMAT_SAMPLE_COUNT]
+    counter = collections.Counter(format_ids[r] for r in counted_indices)
+    format_id = max(counter, key=lambda k: (counter[k], k))
+    return format_id, (float_count / len(non_empty_indices)
+                       * counter[format_id] / len(counted_indices))
+
 
-    # plus long : format réel sur 1000 lignes ou moins
-    counter = collections.Counter()
-    for r in non_empty_indices[:100]:
-        oCell = oRange.getCellByPosition(0, r)
-        counter[oCell.NumberFormat] += 1
+def _guess_formats_np(values: Sequence[Sequence[Any]],
+                      format_ids: Sequence[Sequence[int]]
+                      ) -> List[Tuple[int, float]]:
+    """
+    Same as `guess_formats`, with NumPy.
+    """
+    shape = (len(values), len(values[0]))
+    flat_values = list(itertools.chain.from_iterable(values))
+    size = len(flat_values)
+    # DataArray only contains floats and strings
+    is_float = (np.fromiter(map(type, flat_values), dtype=object, count=size)
+                == float).reshape(shape)
+    is_non_empty = is_float | np.fromiter(
+        map(bool, flat_values), dtype=bool, count=size).reshape(shape)
+    non_empty_counts = is_non_empty.sum(axis=0)
+    float_counts = is_float.sum(axis=0)
+    text_counts = non_empty_counts - float_counts
 
-    return max(counter, key=lambda k: (counter[k], k), default=0)
+    format_ids = np.asarray(format_ids, dtype=np.int64).reshape(shape)
+    first_format_ids = format_ids[0]
+    is_uniform = ((format_ids == first_format_ids).all(axis=0)
+                  & (first_format_ids != 0))
 
+    # the formats of the first non empty cells of each column
+    is_counted = is_non_empty & (
+            np.cumsum(is_non_empty, axis=0) <= FORMAT_SAMPLE_COUNT)
+    # a sheet uses a few distinct formats
+    keys = np.unique(format_ids[is_counted])
+    dominant = np.zeros(shape[1], dtype=np.int64)
+    max_counts = np.zeros(shape[1], dtype=np.int64)
+    for key in keys:  # sorted: on a tie, take the greatest key
+        counts = ((format_ids == key) & is_counted).sum(axis=0)
+        is_max = counts >= max_counts
+        dominant[is_max] = key
+        max_counts[is_max] = counts[is_max]
+    dominant[max_counts == 0] = 0
 
-type_by_format = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        text_confidences = text_counts / non_empty_counts
+        number_confidences = (float_counts / non_empty_counts * max_counts
+                              / is_counted.sum(axis=0))
+    is_text = text_counts > float_counts
+    guessed = np.where(is_uniform, first_format_ids,
+                       np.where(is_text, -1, dominant))
+    confidences = np.where(
+        is_uniform, 1.0,
+        np.where(non_empty_counts == 0, 0.0,
+                 np.where(is_text, text_confidences, number_confidences)))
+    return list(zip(guessed.tolist(), confidences.tolist()))
 
 
-def get_type_id(oFormats, format_id: int) -> NumberFormat:
-    try:
-        return type_by_format[format_id]
-    except KeyError:
-        if format_id == -1:
-            data_type = NumberFormat.TEXT
+Cell = Tuple[int, int]
+# start column, start row, end column, end row (inclusive)
+Rectangle = Tuple[int, int, int, int]
+
+
+def coalesce_cells(cells: Iterable[Cell]) -> List[Rectangle]:
+    """
+    Merge cells into rectangles: the vertical runs of each column are
+    merged with the identical runs of the adjacent columns.
+
+    :param cells: the (column, row) positions
+    :return: the rectangles, sorted by row, then column
+    """
+    runs_by_rows = collections.defaultdict(list)
+    run = None
+    for column, row in sorted(set(cells)):
+        if run is not None and run[0] == column and run[2] == row - 1:
+            run[2] = row
         else:
-            oFormat = oFormats.getByKey(format_id)
-            data_type = oFormat.Type & 0b111111111110
-        type_by_format[format_id] = data_type
-        return data_type
+            if run is not None:
+                runs_by_rows[run[1], run[2]].append(run[0])
+            run = [column, row, row]
+    if run is not None:
+        runs_by_rows[run[1], run[2]].append(run[0])
+
+    rectangles = []
+    for (start_row, end_row), columns in runs_by_rows.items():
+        start_column = end_column = columns[0]
+        for column in columns[1:]:
+            if column == end_column + 1:
+                end_column = column
+            else:
+                rectangles.append(
+                    (start_column, start_row, end_column, end_row))
+                start_column = end_column = column
+        rectangles.append((start_column, start_row, end_column, end_row))
+    rectangles.sort(key=lambda r: (r[1], r[0]))
+    return rectangles
+
+
+def column_name(column: int) -> str:
+    """
+    :param column: the 0-based column index
+    :return: the column name, e.g. "A", "Z", "AA"
+    """
+    name = ""
+    column += 1
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        name = chr(ord("A") + remainder) + name
+    return name
+
+
+def format_range_addresses(sheet_name: str,
+                           rectangles: Iterable[Rectangle]) -> str:
+    """
+    :param sheet_name: the name of the sheet
+    :param rectangles: the rectangles
+    :return: the addresses, e.g. "Sheet1.A1:B3;Sheet1.D5"
+    """
+    # as `RangeAddressesAsString`: a name that is not an identifier, or
+    # that starts with a digit, is quoted and its quotes are doubled
+    if (not sheet_name.replace("_", "").isalnum()
+            or sheet_name[0].isdigit()):
+        sheet_name = "'{}'".format(sheet_name.replace("'", "''"))
+    addresses = []
+    for start_column, start_row, end_column, end_row in rectangles:
+        address = "{}.{}{}".format(sheet_name, column_name(start_column),
+                                   start_row + 1)
+        if (start_column, start_row) != (end_column, end_row):
+            address += ":{}{}".format(column_name(end_column), end_row + 1)
+        addresses.append(address)
+    return ";".join(addresses)
+
+
+# max length of a label
+LABEL_MAX_LENGTH = 50
+# max length of a heading
+TITLE_MAX_LENGTH = 200
+# max length of a text used to compare two annotations
+KEY_MAX_LENGTH = 1000
+
+
+def shorten(text: str, max_len: int = LABEL_MAX_LENGTH) -> str:
+    """
+    :param text: the text
+    :param max_len: the max length
+    :return: the text, or its prefix followed by "..." if it is too long
+    """
+    if len(text) < max_len:
+        return text
+    return text[:max_len - 3] + "..."
+
+
+def get_text_prefix(oCursor: UnoService, max_len: int,
+                    paragraph: bool = False) -> str:
+    """
+    Read at most `max_len` characters of a text, without copying the whole
+    text across the bridge.
+
+    :param oCursor: a text cursor on the text, or on the paragraph if
+    `paragraph` is True. The cursor is moved to the start of the text or of
+    the paragraph.
+    :param max_len: the max number of characters
+    :param paragraph: if True, stop at the end of the paragraph (the
+    cursor may move to the next paragraph)
+    :return: the prefix
+    """
+    if paragraph:
+        oCursor.gotoStartOfParagraph(False)
+    else:
+        oCursor.gotoStart(False)
+    oCursor.goRight(max_len, True)
+    text = oCursor.String
+    if paragraph:
+        for i, c in enumerate(text):
+            if c in "\r\n":
+                return text[:i]
+    return text
+
+
+class ElementLocator:
+    """
+    The start ranges of the elements (paragraphs and tables) of a text, by
+    ordinal. The text is enumerated once, and no further than the greatest
+    ordinal requested so far. The ordinals are stale once the text is
+    modified.
+    """
+
+    def __init__(self, oText: UnoService):
+        self._oEnumeration = oText.createEnumeration()
+        self._oStarts = cast(List[UnoService], [])
+
+    def get_start(self, ordinal: int) -> Optional[UnoService]:
+        """
+        :param ordinal: the ordinal of the element in the text
+        :return: the start of the element, or None if the text has fewer
+        elements
+        """
+        while (len(self._oStarts) <= ordinal
+               and self._oEnumeration.hasMoreElements()):
+            self._oStarts.append(self._oEnumeration.nextElement().Anchor.Start)
+        try:
+            return self._oStarts[ordinal]
+        except IndexError:
+            return None
+
+
+class FormatTypeCache:
+    """
+    The types of the number formats of a `NumberFormats` supplier. The
+    format keys are specific to a document: use one cache per document.
+    """
+    _logger = logging.getLogger(__name__)
+
+    def __init__(self, oFormats: UnoService, max_size: int = 1024):
+        """
+        :param oFormats: the `NumberFormats` of the document
+        :param max_size: the maximum number of cached types. The least
+        recently used types are evicted first.
+        """
+        self._oFormats = oFormats
+        self._max_size = max_size
+        self._type_by_format = cast(
+            "collections.OrderedDict[int, int]", collections.OrderedDict())
+        self.hits = 0
+        self.misses = 0
+
+    def get_type_id(self, format_id: int) -> int:
+        """
+        :param format_id: the format id, -1 for text
+        :return: the type of the format, without the `DEFINED` flag
+        """
+        return self.get_type_ids([format_id])[0]
+
+    def get_type_ids(self, format_ids: Sequence[int]) -> List[int]:
+        """
+        Resolve the types of several formats with one `getByKey` call per
+        distinct format that is not cached.
+
+        :param format_ids: the format ids, -1 for text
+        :return: the types of the formats
+        """
+        type_by_format = {}
+        for format_id in format_ids:
+            if format_id in type_by_format:
+                continue
+            try:
+                type_by_format[format_id] = self._type_by_format[format_id]
+            except KeyError:
+                self.misses += 1
+                type_by_format[format_id] = self._fetch_type_id(format_id)
+                self._type_by_format[format_id] = type_by_format[format_id]
+            else:
+                self.hits += 1
+            self._type_by_format.move_to_end(format_id)
+
+        while len(self._type_by_format) > self._max_size:
+            self._type_by_format.popitem(last=False)
+        self._logger.debug("Format types: %s hits, %s misses", self.hits,
+                           self.misses)
+        return [type_by_format[format_id] for format_id in format_ids]
+
+    def _fetch_type_id(self, format_id: int) -> int:
+        if format_id == -1:
+            return NumberFormat.TEXT
+        oFormat = self._oFormats.getByKey(format_id)
+        return oFormat.Type & 0b111111111110
 
 
 class FakeProvider:
@@ -0,0 +1,129 @@
+import unittest
+
+from ah4lo_cache import DocumentCache, ModifyListener
+from ah4lo_tree import NodeBuilder
+
+
+class FakeBroadcaster:
+    def __init__(self):
+        self.listeners = []
+
+    def addModifyListener(self, listener):
+        self.listeners.append(listener)
+
+    def modify(self):
+        for listener in self.listeners:
+            listener.modified(None)
+
+
+class DocumentCacheTestCase(unittest.TestCase):
+    def test_cached_loader(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return [NodeBuilder("A")]
+
+        cache = DocumentCache()
+        cached = cache.cached_loader("s", loader)
+        self.assertEqual(cached(), cached())
+        self.assertEqual([1], calls)
+
+    def test_watch(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return [NodeBuilder("A")]
+
+        cache = DocumentCache()
+        cache.root = NodeBuilder("R").freeze_as_root()
+        oSheet = FakeBroadcaster()
+        cache.watch("s", oSheet)
+        cache.watch("s", oSheet)
+        self.assertEqual(1, len(oSheet.listeners))
+
+        cached = cache.cached_loader("s", loader)
+        cached()
+        oSheet.modify()
+        self.assertIsNone(cache.root)
+        cached()
+        self.assertEqual([1, 1], calls)
+
+    def test_modified_while_loading(self):
+        cache = DocumentCache()
+        oSheet = FakeBroadcaster()
+        cache.watch("s", oSheet)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            # the worker reads the sheet while the user edits it
+            if len(calls) == 1:
+                oSheet.modify()
+            return [NodeBuilder("A")]
+
+        cached = cache.cached_loader("s", loader)
+        bucket = cache.cached_loader("s/0:100", loader)
+        cached()
+        cached()
+        self.assertEqual([1, 1], calls)
+        cached()
+        bucket()
+        bucket()
+        self.assertEqual([1, 1, 1], calls)
+
+    def test_invalidate_subsections(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return [NodeBuilder("A")]
+
+        cache = DocumentCache()
+        cached = cache.cached_loader("s/0:100", loader)
+        other = cache.cached_loader("s2/0:100", loader)
+        cached()
+        other()
+        cache.invalidate("s")
+        cached()
+        other()
+        self.assertEqual([1, 1, 1], calls)
+
+    def test_validate(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return [NodeBuilder("A")]
+
+        cache = DocumentCache()
+        oDoc = FakeBroadcaster()
+        oDoc.addModifyListener(ModifyListener(cache.on_document_modified,
+                                              lambda: None))
+        oSheet = FakeBroadcaster()
+        cache.watch("s", oSheet)
+        cached = cache.cached_loader("s", loader)
+        cached()
+
+        # a content change is reported by the sheet
+        oDoc.modify()
+        oSheet.modify()
+        cache.validate()
+        cached()
+        self.assertEqual([1, 1], calls)
+
+        # a format change is reported by the document only
+        oDoc.modify()
+        cache.validate()
+        self.assertIsNone(cache.root)
+        cached()
+        self.assertEqual([1, 1, 1], calls)
+
+        cache.validate()
+        cached()
+        self.assertEqual([1, 1, 1], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
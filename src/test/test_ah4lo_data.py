@@ -0,0 +1,335 @@
+import unittest
+from unittest import mock
+
+import lo_helper
+from ah4lo_data import (NodeGrouper, OutlineStyles, DrawingIndex,
+                        fetch_paragraph_record, group_nodes, ActionResolver,
+                        WriterRangeContentBuilder, SheetNodeFactory,
+                        SELECT_COLUMN, GOTO_ELEMENT)
+from ah4lo_cache import DocumentCache
+from ah4lo_lang import AH4LOLang
+from ah4lo_tree import NodeBuilder
+from lo_helper import FormatTypeCache, NumberFormat
+from test_lo_helper import FakeCellRange
+
+
+def label(first: int, last: int) -> str:
+    return "{}-{}".format(first, last)
+
+
+class NodeGrouperTestCase(unittest.TestCase):
+    def _groups(self, count: int):
+        root = NodeBuilder("root")
+        root.extend_children(
+            group_nodes((NodeBuilder(str(i)) for i in range(count)), label))
+        return root.freeze_as_root()
+
+    def test_few_nodes(self):
+        root = self._groups(3)
+        self.assertEqual(["1-3"], [n.value for n in root.children])
+        self.assertEqual(["0", "1", "2"],
+                         [n.value for n in root.children[0].children])
+
+    def test_one_level(self):
+        root = self._groups(100)
+        self.assertEqual(["{}-{}".format(i + 1, i + 10)
+                          for i in range(0, 100, 10)],
+                         [n.value for n in root.children])
+
+    def test_balanced(self):
+        root = self._groups(5001)
+        self.assertEqual(["1-1000", "1001-2000", "2001-3000", "3001-4000",
+                          "4001-5000", "5001-5001"],
+                         [n.value for n in root.children])
+        first = root.children[0]
+        self.assertEqual(10, len(first.children))
+        self.assertEqual("1-100", first.children[0].value)
+        self.assertEqual("1-10", first.children[0].children[0].value)
+        self.assertEqual(
+            "0", first.children[0].children[0].children[0].value)
+        # a lone group is not wrapped again
+        last = root.children[-1]
+        self.assertEqual(["5000"], [n.value for n in last.children])
+
+    def test_no_node(self):
+        self.assertEqual([], NodeGrouper(label).close())
+
+    def test_start(self):
+        grouper = NodeGrouper(label, 20)
+        grouper.append(NodeBuilder("x"))
+        node = grouper.close()[0]
+        self.assertEqual("21-21", str(node.value))
+
+    def test_reuse(self):
+        grouper = NodeGrouper(label)
+        for i in range(3):
+            grouper.append(NodeBuilder(str(i)))
+        grouper.close()
+        for i in range(12):
+            grouper.append(NodeBuilder(str(i)))
+        self.assertEqual(["1-10", "11-12"],
+                         [str(n.value) for n in grouper.close()])
+
+    def test_append_group(self):
+        grouper = NodeGrouper(label)
+        last = None
+        for i in range(11):
+            last = grouper.append_group(10)
+        groups = grouper.close()
+        self.assertEqual(["1-100", "101-110"],
+                         [str(n.value) for n in groups])
+        self.assertEqual("1-10", str(groups[0].children[0].value))
+        self.assertIs(last, groups[1])
+
+
+class OutlineStylesTestCase(unittest.TestCase):
+    def test_is_outline(self):
+        oHeading = mock.Mock(NumberingStyleName="Outline", ParentStyle="")
+        oBody = mock.Mock(NumberingStyleName="", ParentStyle="")
+        oNumbering = mock.Mock()
+        oNumbering.NumberingRules.NumberingIsOutline = True
+        oParagraphStyles = mock.Mock()
+        oParagraphStyles.getByName.side_effect = {
+            "Heading": oHeading, "Body": oBody
+        }.get
+        oNumberingStyles = mock.Mock()
+        oNumberingStyles.getByName.return_value = oNumbering
+
+        styles = OutlineStyles(oParagraphStyles, oNumberingStyles)
+        self.assertEqual([True, False, True, False],
+                         [styles.is_outline(name) for name in
+                          ("Heading", "Body", "Heading", "Body")])
+        self.assertEqual(2, oParagraphStyles.getByName.call_count)
+        self.assertEqual(7, styles.uno_calls)
+        self.assertEqual(7, styles.saved_uno_calls)
+
+
+class FakeIndexAccess:
+    def __init__(self, *elements):
+        self.elements = elements
+        self.Count = len(elements)
+
+    def getByIndex(self, i):
+        return self.elements[i]
+
+
+class DrawingIndexTestCase(unittest.TestCase):
+    def test_create(self):
+        oParagraph = object()
+        oAnchored = mock.Mock()
+        oAnchored.Anchor.TextParagraph = oParagraph
+        oOrphan = mock.Mock(Anchor=None)
+        oDoc = mock.Mock(DrawPages=FakeIndexAccess(
+            FakeIndexAccess(oAnchored, oOrphan)))
+
+        index = DrawingIndex.create(oDoc)
+        self.assertEqual([oAnchored], index.find_drawings(oParagraph))
+        self.assertEqual([], index.find_drawings(object()))
+        self.assertEqual([oOrphan], index.orphans)
+
+
+class SheetNodeFactoryTestCase(unittest.TestCase):
+    def _factory(self) -> SheetNodeFactory:
+        oFormats = mock.Mock()
+        oFormats.getByKey.side_effect = lambda k: mock.Mock(
+            Type=NumberFormat.DATE if k == 10 else NumberFormat.NUMBER)
+        oSheet = mock.Mock()
+        oSheet.Name = "Sheet1"
+        return SheetNodeFactory(AH4LOLang.from_lang("en"), mock.Mock(),
+                                oSheet, FormatTypeCache(oFormats))
+
+    def _column_nodes(self, start: int, end: int):
+        # a used range C5:E24 with a header row
+        cells = {(2, 4): ("Name", 0), (3, 4): (2023.0, 0)}
+        for r in range(5, 24):
+            cells[2, r] = (float(r), 10)
+            # 14 texts and 5 numbers
+            cells[3, r] = ("t", 0) if r >= 10 else (float(r), 0)
+        oRange = FakeCellRange(cells, 2, 4, 4, 23)
+        factory = self._factory()
+        return factory, factory._get_column_nodes(oRange, start, end)
+
+    def test_get_column_nodes(self):
+        factory, nodes = self._column_nodes(0, 3)
+        lang = factory.ah4lo_lang
+        self.assertEqual([lang.column("Name", NumberFormat.DATE),
+                          lang.column("2023", NumberFormat.TEXT, True),
+                          lang.column(lang.empty_word, NumberFormat.NUMBER)],
+                         [str(node.value) for node in nodes])
+        self.assertEqual([(SELECT_COLUMN, "Sheet1", c) for c in (2, 3, 4)],
+                         [node.action for node in nodes])
+
+        _, nodes = self._column_nodes(1, 3)
+        self.assertEqual([(SELECT_COLUMN, "Sheet1", c) for c in (3, 4)],
+                         [node.action for node in nodes])
+
+    def _buckets(self, column_count: int):
+        # a used range that starts at column C, with a header row only
+        oRange = FakeCellRange({}, 2, 0, 2 + column_count - 1, 0)
+        factory = self._factory()
+        lang = factory.ah4lo_lang
+        return lang, factory._get_column_buckets(oRange, 0, column_count)
+
+    def test_get_column_buckets(self):
+        lang, nodes = self._buckets(10)
+        self.assertEqual([(SELECT_COLUMN, "Sheet1", c) for c in range(2, 12)],
+                         [node.action for node in nodes])
+
+        lang, nodes = self._buckets(25)
+        self.assertEqual([lang.columns_range(1, 10),
+                          lang.columns_range(11, 20),
+                          lang.columns_range(21, 25)],
+                         [str(node.value) for node in nodes])
+        self.assertEqual((SELECT_COLUMN, "Sheet1", 12),
+                         nodes[1].children[0].action)
+
+        lang, nodes = self._buckets(150)
+        self.assertEqual([lang.columns_range(1, 100),
+                          lang.columns_range(101, 150)],
+                         [str(node.value) for node in nodes])
+
+    def test_get_column_buckets_lazy(self):
+        lang, nodes = self._buckets(250)
+        self.assertEqual([lang.columns_range(1, 100),
+                          lang.columns_range(101, 200),
+                          lang.columns_range(201, 250)],
+                         [str(node.value) for node in nodes])
+        groups = nodes[1].loader()
+        self.assertEqual(lang.columns_range(101, 110), str(groups[0].value))
+        self.assertEqual((SELECT_COLUMN, "Sheet1", 102),
+                         groups[0].children[0].action)
+        self.assertEqual(5, len(nodes[2].loader()))
+
+        lang, nodes = self._buckets(1500)
+        self.assertEqual([lang.columns_range(1, 1000),
+                          lang.columns_range(1001, 1500)],
+                         [str(node.value) for node in nodes])
+        buckets = nodes[1].loader()
+        self.assertEqual([lang.columns_range(c + 1, c + 100)
+                          for c in range(1000, 1500, 100)],
+                         [str(node.value) for node in buckets])
+        self.assertEqual((SELECT_COLUMN, "Sheet1", 1402),
+                         buckets[-1].loader()[0].children[0].action)
+
+    def test_get_column_nodes_pure_python(self):
+        with mock.patch.object(lo_helper, "np", None):
+            factory, nodes = self._column_nodes(0, 3)
+        self.assertEqual(factory.ah4lo_lang.column("Name", NumberFormat.DATE),
+                         str(nodes[0].value))
+
+
+class ParagraphRecordTestCase(unittest.TestCase):
+    def test_fetch(self):
+        oParagraph = mock.Mock()
+        oParagraph.getPropertyValues.return_value = ("Heading 1", "1.2", 1)
+        record = fetch_paragraph_record(oParagraph)
+        self.assertEqual(("Heading 1", "1.2", 1),
+                         (record.style_name, record.list_label,
+                          record.numbering_level))
+        oParagraph.getPropertyValues.assert_called_once_with(
+            ("ParaStyleName", "ListLabelString", "NumberingLevel"))
+
+    def test_fetch_fallback(self):
+        oParagraph = mock.Mock(ParaStyleName="Standard", ListLabelString="",
+                               NumberingLevel=0)
+        oParagraph.getPropertyValues.side_effect = Exception
+        record = fetch_paragraph_record(oParagraph)
+        self.assertEqual(("Standard", "", 0),
+                         (record.style_name, record.list_label,
+                          record.numbering_level))
+
+
+class WriterRangeContentBuilderTestCase(unittest.TestCase):
+    def _paragraph(self, style_name: str):
+        oParagraph = mock.Mock()
+        oParagraph.supportsService.return_value = False
+        oParagraph.getPropertyValues.return_value = (style_name, "1", 0)
+        return oParagraph
+
+    def test_build(self):
+        oTitle = self._paragraph("Heading")
+        oParagraphs = [self._paragraph("Body") for _ in range(12)]
+        oTextRange = mock.Mock()
+        oEnumeration = oTextRange.Text.createEnumeration.return_value
+        oEnumeration.hasMoreElements.side_effect = [True] * 13 + [False]
+        oEnumeration.nextElement.side_effect = [oTitle] + oParagraphs
+        oTextRange.Text.createTextCursor.return_value.String = "text"
+        oDrawing = object()
+        dnf = mock.Mock()
+        dnf.find_drawings.side_effect = lambda oElement: (
+            [oDrawing] if oElement is oParagraphs[0] else [])
+        dnf.create_drawing_node.return_value = NodeBuilder("drawing")
+        outline_styles = mock.Mock()
+        outline_styles.is_outline.side_effect = lambda name: (
+            name == "Heading")
+
+        content_node = WriterRangeContentBuilder(
+            AH4LOLang.from_lang("en"), mock.Mock(), oTextRange,
+            NodeBuilder("content"), dnf, outline_styles).build()
+        title_node, = content_node.children
+        self.assertEqual("1. text", str(title_node.value))
+        # only the title was read
+        oCursor = oTextRange.Text.createTextCursor.return_value
+        self.assertEqual(1, oCursor.gotoRange.call_count)
+
+        # the drawing counts as a node
+        groups = title_node.children
+        self.assertEqual([10, 3], [len(group.loader()) for group in groups])
+        # a loaded group keeps its children, not the elements
+        self.assertEqual([None, None], [group.loader for group in groups])
+        self.assertEqual((GOTO_ELEMENT, "", 2),
+                         groups[0].children[2].action)
+
+
+class ActionResolverTestCase(unittest.TestCase):
+    def test_select_column(self):
+        oDoc = mock.Mock()
+        ActionResolver(oDoc)((SELECT_COLUMN, "Sheet1", 3))
+        oDoc.Sheets.getByName.assert_called_once_with("Sheet1")
+        oColumns = oDoc.Sheets.getByName.return_value.Columns
+        oColumns.getByIndex.assert_called_once_with(3)
+        oDoc.CurrentController.select.assert_called_once_with(
+            oColumns.getByIndex.return_value)
+
+    def _text_doc(self, element_count: int):
+        oElements = [mock.Mock() for _ in range(element_count)]
+        oDoc = mock.Mock()
+        oText = oDoc.TextFrames.getByName.return_value.Text
+
+        def create_enumeration():
+            oEnumeration = mock.Mock()
+            oEnumeration.hasMoreElements.side_effect = (
+                [True] * element_count + [False])
+            oEnumeration.nextElement.side_effect = oElements
+            return oEnumeration
+
+        oText.createEnumeration.side_effect = create_enumeration
+        return oDoc, oText, oElements
+
+    def test_goto_element(self):
+        oDoc, oText, oElements = self._text_doc(2)
+        ActionResolver(oDoc)((GOTO_ELEMENT, "Frame1", 1))
+        oDoc.CurrentController.ViewCursor.gotoRange.assert_called_once_with(
+            oElements[1].Anchor.Start, False)
+
+    def test_goto_element_enumerates_once(self):
+        oDoc, oText, oElements = self._text_doc(3)
+        cache = DocumentCache()
+        resolver = ActionResolver(oDoc, cache)
+        resolver((GOTO_ELEMENT, "Frame1", 2))
+        resolver((GOTO_ELEMENT, "Frame1", 0))
+        resolver((GOTO_ELEMENT, "Frame1", 5))
+        self.assertEqual(1, oText.createEnumeration.call_count)
+        oGotoRange = oDoc.CurrentController.ViewCursor.gotoRange
+        self.assertEqual([mock.call(oElements[2].Anchor.Start, False),
+                          mock.call(oElements[0].Anchor.Start, False)],
+                         oGotoRange.call_args_list)
+
+        # the ordinals are resolved again after a modification
+        cache.on_document_modified()
+        resolver((GOTO_ELEMENT, "Frame1", 0))
+        self.assertEqual(2, oText.createEnumeration.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+import time
+import unittest
+from unittest import mock
+
+from ah4lo_dialogs import (ScrollTreeHelper, ItemKeyListener, ContentSearch,
+                           ListTreeHelper,
+                           DOWN_KEY, UP_KEY, ESC_KEY, ENTER_KEY, F3_KEY,
+                           F_KEY, MOD1)
+from ah4lo_lang import AH4LOLang
+from ah4lo_search import ContentIndex
+from ah4lo_tree import NodeBuilder
+
+
+class FakeModel:
+    def __init__(self, name: str):
+        self.Name = name
+        self.Label = ""
+
+
+class FakeControl:
+    def __init__(self, name: str):
+        self.Model = FakeModel(name)
+        self.Visible = False
+        self.sets = []
+
+    def __setattr__(self, key, value):
+        if key == "Visible" and hasattr(self, "sets"):
+            self.sets.append((key, value))
+        super().__setattr__(key, value)
+
+    def setFocus(self):
+        pass
+
+
+class ScrollTreeHelperTestCase(unittest.TestCase):
+    def _helper(self, line_count: int):
+        root = NodeBuilder("R")
+        root.extend_children(NodeBuilder(str(i)) for i in range(10))
+        helper = ScrollTreeHelper(root.freeze_as_root(), line_count, 100, 10)
+        controls = [FakeControl("scroll_tree{}".format(i))
+                    for i in range(line_count)]
+        oDialogControl = mock.Mock()
+        oDialogControl.getControl.side_effect = {
+            c.Model.Name: c for c in controls}.get
+        return helper, oDialogControl, controls
+
+    def test_place_lines(self):
+        helper, oDialogControl, controls = self._helper(5)
+        helper.place_lines(oDialogControl)
+        self.assertEqual([False, False, True, False, False],
+                         [c.Visible for c in controls])
+        self.assertEqual("R +", controls[2].Model.Label.strip())
+
+    def test_place_lines_diff(self):
+        helper, oDialogControl, controls = self._helper(5)
+        helper.place_lines(oDialogControl)
+        for c in controls:
+            c.sets.clear()
+        helper.place_lines(oDialogControl)
+        self.assertEqual([[]] * 5, [c.sets for c in controls])
+
+        helper.tree.left()
+        helper.place_lines(oDialogControl)
+        for c in controls:
+            c.sets.clear()
+        helper.tree.down()
+        helper.place_lines(oDialogControl)
+        self.assertEqual([[("Visible", True)], [], [], [], []],
+                         [c.sets for c in controls])
+        self.assertEqual(["R -", "0", "1", "2", "3"],
+                         [c.Model.Label.strip() for c in controls])
+
+    def test_bind_controls(self):
+        helper, oDialogControl, controls = self._helper(5)
+        helper.place_lines(oDialogControl)
+        helper.place_lines(oDialogControl)
+        self.assertEqual(5, oDialogControl.getControl.call_count)
+
+    def test_start_loading(self):
+        root = NodeBuilder("R")
+        root.extend_children([NodeBuilder("A", loader=lambda: [
+            NodeBuilder("B")])])
+        posted = []
+        helper = ScrollTreeHelper(root.freeze_as_root(), 5, 100, 10,
+                                  post=posted.append)
+        helper.place_lines = mock.Mock()
+        helper._visible_indices = {0, 1}
+        oDialogControl = mock.Mock()
+        helper.start_loading(oDialogControl)
+        helper._background_loader.join(5)
+
+        # the worker does not redraw, the main thread does
+        helper.place_lines.assert_not_called()
+        self.assertEqual(1, len(posted))
+        posted[0]()
+        helper.place_lines.assert_called_once_with(oDialogControl)
+
+
+class ListTreeHelperTestCase(unittest.TestCase):
+    def test_place_lines(self):
+        root = NodeBuilder("R")
+        root.extend_children(NodeBuilder(str(i)) for i in range(10))
+        helper = ListTreeHelper(root.freeze_as_root(), 5, 100, 10)
+        oListControl = mock.Mock()
+        oDialogControl = mock.Mock()
+        oDialogControl.getControl.return_value = oListControl
+        oModel = oListControl.Model
+
+        helper.place_lines(oDialogControl)
+        oModel.setPropertyValues.assert_called_once_with(
+            ("SelectedItems", "StringItemList"), ((0,), (helper.tree.text(
+                helper.tree.focus),)))
+
+        helper.tree.left()
+        helper.place_lines(oDialogControl)
+        names, (selected, items) = oModel.setPropertyValues.call_args[0]
+        self.assertEqual((1,), selected)
+        self.assertEqual(["R -", "0", "1", "2"],
+                         [item.strip() for item in items])
+
+        oModel.setPropertyValues.reset_mock()
+        oModel.SelectedItems = (2,)
+        helper.place_lines(oDialogControl)
+        oModel.setPropertyValues.assert_not_called()
+        self.assertEqual((1,), oModel.SelectedItems)
+
+        helper.resize(oDialogControl, 9)
+        self.assertEqual(90, oModel.Height)
+        self.assertEqual(90, oDialogControl.Model.Height)
+        names, (selected, items) = oModel.setPropertyValues.call_args[0]
+        self.assertEqual(6, len(items))
+
+
+class ItemKeyListenerTestCase(unittest.TestCase):
+    def _listener(self):
+        root = NodeBuilder("R")
+        root.extend_children(NodeBuilder(str(i)) for i in range(20))
+        self.posted = []
+        helper = ScrollTreeHelper(root.freeze_as_root(), 5, 100, 10,
+                                  post=self.posted.append)
+        helper.place_lines = mock.Mock()
+        helper.tree.left()
+        return ItemKeyListener(helper, mock.Mock(), 0.05)
+
+    def _press(self, listener, key_code, key_char="", modifiers=0):
+        e = mock.Mock(KeyCode=key_code, KeyChar=key_char, Modifiers=modifiers)
+        listener.keyPressed(e)
+        listener.keyReleased(e)
+
+    def test_keys(self):
+        listener = self._listener()
+        helper = listener.helper
+        self._press(listener, DOWN_KEY)
+        self._press(listener, DOWN_KEY)
+        self._press(listener, UP_KEY)
+        self.assertEqual("1", helper.tree.focus.value)
+        self.assertGreater(listener.last_latency, 0.0)
+        self.assertGreaterEqual(listener.max_latency, listener.last_latency)
+
+        self._press(listener, ESC_KEY)
+        listener.oDialogControl.dispose.assert_called_once_with()
+
+    def test_key_repeat(self):
+        listener = self._listener()
+        helper = listener.helper
+        e = mock.Mock(KeyCode=DOWN_KEY, KeyChar="", Modifiers=0)
+        for _ in range(10):
+            listener.keyPressed(e)
+        self.assertEqual("10", helper.tree.focus.value)
+        self.assertEqual(1, helper.place_lines.call_count)
+
+        listener.keyReleased(e)
+        time.sleep(0.2)
+        # the timer posts the redraw to the main thread
+        self.assertEqual(1, helper.place_lines.call_count)
+        self.assertEqual(1, len(self.posted))
+        self.posted[0]()
+        self.assertEqual(2, helper.place_lines.call_count)
+
+    def test_type_ahead(self):
+        listener = self._listener()
+        helper = listener.helper
+        self._press(listener, 0x200 + 1, "1")
+        self.assertEqual("1", helper.tree.focus.value)
+        self._press(listener, 0x200 + 1, "1")
+        self.assertEqual("11", helper.tree.focus.value)
+        self._press(listener, ENTER_KEY)
+        self.assertEqual("11", helper.tree.focus.value)
+        self._press(listener, ESC_KEY)
+        self.assertFalse(helper.type_ahead.active)
+        listener.oDialogControl.dispose.assert_not_called()
+
+        self._press(listener, 0x200 + 1, "1")
+        self._press(listener, F3_KEY)
+        self.assertEqual("12", helper.tree.focus.value)
+
+    def test_search(self):
+        listener = self._listener()
+        helper = listener.helper
+        index = ContentIndex()
+        index.start_segment("s")
+        index.add_chunk("s", [("Result", ("kind",), "hello world")])
+        calls = []
+        get_sections = mock.Mock(return_value=[])
+        helper.search = ContentSearch(AH4LOLang.from_lang("en"), index,
+                                      calls.append, get_sections)
+        # the content is indexed on the first search only
+        get_sections.assert_not_called()
+
+        self._press(listener, F_KEY, "f", MOD1)
+        get_sections.assert_called_once_with()
+        for c in "hello":
+            self._press(listener, 0x200, c)
+        self.assertEqual("Search: hello", helper.tree.focus.value)
+        self._press(listener, ENTER_KEY)
+        self.assertEqual("Search 'hello': 1 result", helper.tree.focus.value)
+        helper.tree.left()
+        self._press(listener, ENTER_KEY)
+        self.assertEqual([("kind",)], calls)
+
+        self._press(listener, ESC_KEY)
+        self.assertIs(helper.document_tree, helper.tree)
+        listener.oDialogControl.dispose.assert_not_called()
+
+        self._press(listener, F_KEY, "f", MOD1)
+        get_sections.assert_called_once_with()
+        helper.stop_loading()
+
+
+if __name__ == '__main__':
+    unittest.main()
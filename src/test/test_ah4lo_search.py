@@ -0,0 +1,73 @@
+import unittest
+
+from ah4lo_search import ContentIndex, ContentIndexer, tokenize
+
+
+class ContentIndexTestCase(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(["élan", "42", "foo_bar"],
+                         tokenize("Élan: 42, foo_bar!"))
+
+    def test_search(self):
+        index = ContentIndex()
+        index.start_segment("Sheet1")
+        index.add_chunk("Sheet1", [
+            ("A", ("select_column", "Sheet1", 0), "Paris London"),
+            ("B", ("select_column", "Sheet1", 1), "Paris Rome"),
+            ("A", ("select_column", "Sheet1", 0), "paris"),
+        ])
+        self.assertEqual(["A", "B"],
+                         [value for value, _ in index.search("PARIS")])
+        self.assertEqual(["B"],
+                         [value for value, _ in index.search("rome paris")])
+        self.assertEqual([], index.search("berlin"))
+        self.assertEqual(5, index.posting_count)
+
+    def test_evict(self):
+        index = ContentIndex()
+        index.start_segment("s")
+        index.add_chunk("s", [("A", ("a",), "word")])
+        index.complete_segment("s")
+        self.assertTrue(index.is_indexed("s"))
+        index.evict("s")
+        self.assertFalse(index.is_indexed("s"))
+        self.assertEqual([], index.search("word"))
+        self.assertEqual(0, index.posting_count)
+
+    def test_max_posting_count(self):
+        index = ContentIndex(3)
+        index.start_segment("s1")
+        self.assertTrue(index.add_chunk("s1", [("A", ("a",), "w1 w2")]))
+        index.start_segment("s2")
+        self.assertTrue(index.add_chunk("s2", [("B", ("b",), "w1 w2")]))
+        self.assertFalse(index.is_indexed("s1"))
+        self.assertTrue(index.partial)
+        self.assertFalse(index.add_chunk("s2", [("C", ("c",), "w3 w4")]))
+        # truncated
+        self.assertTrue(index.is_indexed("s2"))
+
+
+class ContentIndexerTestCase(unittest.TestCase):
+    def test_run(self):
+        index = ContentIndex()
+        calls = []
+
+        def read():
+            calls.append(1)
+            yield [("A", ("a",), "hello")]
+            yield [("B", ("b",), "hello world")]
+
+        indexer = ContentIndexer(index, [("s", read)], 0.0)
+        indexer.start()
+        indexer.join(5)
+        self.assertEqual(["B"],
+                         [value for value, _ in index.search("world")])
+
+        indexer = ContentIndexer(index, [("s", read)], 0.0)
+        indexer.start()
+        indexer.join(5)
+        self.assertEqual([1], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 
-from ah4lo_tree import NodeBuilder
+import threading
+
+from ah4lo_tree import (NodeBuilder, Tree, BackgroundLoader, NO_NODE, Label,
+                        LabelIndex)
 
 
 class NodeTestCase(unittest.TestCase):
@@ -29,18 +32,303 @@ class NodeTestCase(unittest.TestCase):
         e.append_child(h)
 
         print(a)
-        a.freeze_as_root()
-        print(a)
+        root = a.freeze_as_root()
+        print(root)
+
+        self.assertEqual(["B", "E"], [n.value for n in root.children])
+        b_node, e_node = root.children
+        self.assertEqual(["C", "D"], [n.value for n in b_node.children])
+        self.assertEqual(["F", "G", "H"],
+                         [n.value for n in e_node.children])
+        f_node, g_node, h_node = e_node.children
+        self.assertEqual(2, g_node.level)
+        self.assertEqual(e_node, g_node.parent)
+        self.assertEqual(f_node, g_node.previous_sibling)
+        self.assertEqual(h_node, g_node.next_sibling)
+        self.assertIsNone(h_node.next_sibling)
+        self.assertIsNone(h_node.next())
+        self.assertEqual(e_node, b_node.children[1].next())
+        self.assertEqual(b_node, e_node.previous())
+        self.assertEqual(root, b_node.previous())
+
+    def test_store(self):
+        a = NodeBuilder("A")
+        a.extend_children([NodeBuilder("".join(["B", "B"])),
+                           NodeBuilder("".join(["B", "B"]))])
+        root = a.freeze_as_root()
+        store = root.store
+        self.assertEqual(3, len(store))
+        self.assertEqual([-1, 0, 0], list(store.parents))
+        self.assertEqual([0, 1, 1], list(store.levels))
+        self.assertIs(store.labels[1], store.labels[2])
+
+    def test_label(self):
+        calls = []
+
+        def formatter(first, last):
+            calls.append(1)
+            return "{} to {}".format(first, last)
+
+        root = NodeBuilder(Label(formatter, 1, 10)).freeze_as_root()
+        self.assertEqual([], calls)
+        self.assertEqual("1 to 10", root.value)
+        self.assertEqual("1 to 10", root.value)
+        self.assertEqual([1], calls)
+
+    def test_action_descriptor(self):
+        calls = []
+        root = NodeBuilder("A", ("kind", 1)).freeze_as_root()
+        root.execute()  # no resolver: logged
+        root.store.resolver = calls.append
+        root.execute()
+        self.assertEqual([("kind", 1)], calls)
+
+    def test_deep_tree(self):
+        root = NodeBuilder("0")
+        cur = root
+        for i in range(1, 5000):
+            node = NodeBuilder(str(i))
+            cur.append_child(node)
+            cur = node
+        cur.append_child(NodeBuilder("leaf"))
+
+        frozen = root.freeze_as_root()
+        self.assertEqual(5001, len(frozen.store))
+        self.assertEqual(5000, frozen.store.levels[-1])
+
+    def test_lines(self):
+        a = NodeBuilder("A")
+        b = NodeBuilder("B")
+        e = NodeBuilder("E")
+        a.extend_children([b, e])
+        b.extend_children([NodeBuilder("C"), NodeBuilder("D")])
+        e.extend_children([NodeBuilder("F"), NodeBuilder("G")])
+        root = a.freeze_as_root()
+        d_node = root.children[0].children[1]
+
+        self.assertEqual(["C", "B", "A"],
+                         [n.value for n in d_node.previous_nodes(5)])
+        self.assertEqual(["C"], [n.value for n in d_node.previous_nodes(1)])
+        self.assertEqual(["E"], [n.value for n in d_node.next_nodes(5)])
+
+    def test_is_ancestor(self):
+        a = NodeBuilder("A")
+        b = NodeBuilder("B")
+        lazy = NodeBuilder("L", loader=lambda: [lazy_child])
+        lazy_child = NodeBuilder("LC", loader=lambda: [NodeBuilder("LCC")])
+        a.extend_children([b, lazy])
+        b.append_child(NodeBuilder("C"))
+        root = a.freeze_as_root()
+        store = root.store
+        b_node, l_node = root.children
+        c_node = b_node.children[0]
+
+        self.assertTrue(store.is_ancestor(root.index, c_node.index))
+        self.assertTrue(store.is_ancestor(b_node.index, c_node.index))
+        self.assertFalse(store.is_ancestor(c_node.index, c_node.index))
+        self.assertFalse(store.is_ancestor(l_node.index, c_node.index))
+        self.assertFalse(store.is_ancestor(c_node.index, b_node.index))
+
+        l_node.load()
+        lc_node = l_node.first_child
+        lc_node.load()
+        lcc_node = lc_node.first_child
+        for node in (root, l_node, lc_node):
+            self.assertTrue(store.is_ancestor(node.index, lcc_node.index))
+        self.assertFalse(store.is_ancestor(b_node.index, lcc_node.index))
+        self.assertFalse(store.is_ancestor(lcc_node.index, lc_node.index))
+
+    def test_text(self):
+        a = NodeBuilder("A")
+        b = NodeBuilder("B")
+        a.extend_children([b, NodeBuilder("E")])
+        b.append_child(NodeBuilder("C"))
+        e = a.children[1]
+        e.append_child(NodeBuilder("F"))
+        tree = Tree(a.freeze_as_root())
+        tree.left()
+        tree.left()
+
+        self.assertEqual(24 * " " + "A -", tree.text(tree.root))
+        b_node, e_node = tree.root.children
+        self.assertEqual(28 * " " + "B -", tree.text(b_node))
+        self.assertEqual(28 * " " + "E +", tree.text(e_node))
+        self.assertEqual(32 * " " + "C", tree.text(tree.focus))
+
+    def test_lazy_node(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return [NodeBuilder("B"), NodeBuilder("C")]
+
+        a = NodeBuilder("A")
+        lazy = NodeBuilder("L", loader=loader)
+        a.append_child(lazy)
+        tree = Tree(a.freeze_as_root())
+        tree.left()
+        self.assertEqual("L", tree.focus.value)
+        self.assertTrue(tree.focus.has_children())
+        self.assertTrue(tree.text(tree.focus).endswith(" +"))
+        self.assertEqual([], calls)
+
+        tree.left()
+        self.assertEqual("B", tree.focus.value)
+        self.assertEqual(2, tree.focus.level)
+        tree.down()
+        self.assertEqual("C", tree.focus.value)
+        self.assertEqual("B", tree.focus.previous().value)
+        self.assertIsNone(tree.focus.next())
+        tree.right()
+        tree.left()
+        self.assertEqual([1], calls)
+
+    def test_lazy_node_lines(self):
+        a = NodeBuilder("A")
+        lazy = NodeBuilder("L", loader=lambda: [NodeBuilder("B")])
+        a.extend_children([lazy, NodeBuilder("M")])
+        root = a.freeze_as_root()
+
+        tree = Tree(root)
+        tree.left()
+        tree.left()
+        self.assertEqual(["L", "A"],
+                         [n.value for n in tree.focus.previous_nodes(5)])
+        self.assertEqual(["M"], [n.value for n in tree.focus.next_nodes(5)])
+
+    def test_failing_loader(self):
+        def loader():
+            raise ValueError()
+
+        root = NodeBuilder("A", loader=loader).freeze_as_root()
+
+        tree = Tree(root)
+        tree.left()
+        self.assertEqual(root, tree.focus)
+        self.assertFalse(root.has_children())
+
+
+class LabelIndexTestCase(unittest.TestCase):
+    def test_find(self):
+        root = NodeBuilder("Root")
+        root.extend_children([NodeBuilder("Beta"), NodeBuilder("alpha"),
+                              NodeBuilder(Label("Al{}".format, "so"))])
+        root = root.freeze_as_root()
+        index = LabelIndex(root.store)
+        self.assertEqual("alpha", index.find("AL").value)
+        self.assertEqual("Also", index.find("al", 2).value)
+        self.assertEqual("alpha", index.find("al", 3).value)
+        self.assertIsNone(index.find("z"))
+
+    def test_find_loaded(self):
+        root = NodeBuilder("Root", None, lambda: [NodeBuilder("Child")])
+        root = root.freeze_as_root()
+        index = LabelIndex(root.store)
+        self.assertIsNone(index.find("c"))
+        root.load()
+        self.assertEqual("Child", index.find("c").value)
+
+
+class BackgroundLoaderTestCase(unittest.TestCase):
+    def test_load_all(self):
+        a = NodeBuilder("A")
+        a.extend_children([
+            NodeBuilder("L1", loader=lambda: [
+                NodeBuilder("L11", loader=lambda: [NodeBuilder("X")])]),
+            NodeBuilder("L2", loader=lambda: [NodeBuilder("Y")]),
+        ])
+        root = a.freeze_as_root()
+        loaded = []
 
-        print(b)
-        print(e)
+        loader = BackgroundLoader(root.store, loaded.append, 0)
+        loader.start()
+        loader.join(5)
 
-        print(c)
-        print(d)
+        self.assertEqual(NO_NODE, root.store.pending_loader())
+        self.assertEqual(["L1", "L2", "L11"],
+                         [root.store.labels[i] for i in loaded])
+        self.assertEqual(6, len(root.store))
+
+    def test_cancel(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_loader():
+            started.set()
+            release.wait(5)
+            return [NodeBuilder("X")]
+
+        a = NodeBuilder("A")
+        a.extend_children([NodeBuilder("L1", loader=slow_loader),
+                           NodeBuilder("L2", loader=lambda: [])])
+        root = a.freeze_as_root()
+        loader = BackgroundLoader(root.store, None, 0)
+        loader.start()
+        started.wait(5)
+        self.assertFalse(root.children[0].load(False))
+        loader.cancel()
+        release.set()
+        loader.join(5)
+
+        self.assertEqual("X", root.children[0].first_child.value)
+        self.assertTrue(root.children[1].has_children())
+
+    def test_left_while_busy(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_loader():
+            started.set()
+            release.wait(5)
+            return []
+
+        a = NodeBuilder("A")
+        b = NodeBuilder("B")
+        b.append_child(NodeBuilder("B1"))
+        a.extend_children([b, NodeBuilder("L", loader=slow_loader)])
+        root = a.freeze_as_root()
+        tree = Tree(root)
+        tree.goto(root.children[0])
+        loader = BackgroundLoader(root.store, None, 0)
+        loader.start()
+        started.wait(5)
+        # B is loaded: the busy worker does not matter
+        tree.left()
+        self.assertEqual("B1", tree.focus.value)
+        release.set()
+        loader.join(5)
+
+    def test_request_load(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_loader():
+            started.set()
+            release.wait(5)
+            return [NodeBuilder("X")]
+
+        a = NodeBuilder("A")
+        a.extend_children([NodeBuilder("L1", loader=slow_loader),
+                           NodeBuilder("L2", loader=lambda: []),
+                           NodeBuilder("L3", loader=lambda: [
+                               NodeBuilder("Z")])])
+        root = a.freeze_as_root()
+        tree = Tree(root)
+        tree.goto(root.children[2])
+        loaded = []
+        loader = BackgroundLoader(root.store, loaded.append, 0)
+        loader.start()
+        started.wait(5)
+        tree.left()
+        self.assertEqual("L3", tree.focus.value)
+        self.assertFalse(tree.resume())
+        release.set()
+        loader.join(5)
 
-        print(f)
-        print(g)
-        print(h)
+        self.assertEqual(["L1", "L3", "L2"],
+                         [root.store.labels[i] for i in loaded])
+        self.assertTrue(tree.resume())
+        self.assertEqual("Z", tree.focus.value)
 
 
 if __name__ == '__main__':
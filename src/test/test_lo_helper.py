@@ -1,10 +1,62 @@
 import logging
 import os
+import random
 import unittest
 import platform
 from pathlib import Path
+from unittest import mock
 
 from py4lo_commons import init_logger
+import lo_helper
+from lo_helper import (guess_format_ids, guess_formats, sample_windows,
+                       coalesce_cells, column_name, format_range_addresses,
+                       FormatTypeCache, shorten, get_text_prefix,
+                       fetch_sample)
+
+
+class FakeCellRange:
+    """
+    A range of a sheet. The cells are given by absolute (column, row)
+    positions: (value, format id). The other cells are empty.
+    """
+
+    def __init__(self, cells, start_column: int, start_row: int,
+                 end_column: int, end_row: int):
+        self.cells = cells
+        self.RangeAddress = mock.Mock(
+            StartColumn=start_column, StartRow=start_row,
+            EndColumn=end_column, EndRow=end_row)
+
+    def getCellRangeByPosition(self, left, top, right, bottom):
+        address = self.RangeAddress
+        return FakeCellRange(
+            self.cells, address.StartColumn + left, address.StartRow + top,
+            address.StartColumn + right, address.StartRow + bottom)
+
+    def _positions(self):
+        address = self.RangeAddress
+        return [[(c, r) for c in range(address.StartColumn,
+                                       address.EndColumn + 1)]
+                for r in range(address.StartRow, address.EndRow + 1)]
+
+    @property
+    def DataArray(self):
+        return tuple(tuple(self.cells.get(p, ("", 0))[0] for p in row)
+                     for row in self._positions())
+
+    @property
+    def UniqueCellFormatRanges(self):
+        # one address per cell, grouped by format
+        addresses_by_format = {}
+        for row in self._positions():
+            for c, r in row:
+                format_id = self.cells.get((c, r), ("", 0))[1]
+                addresses_by_format.setdefault(format_id, []).append(
+                    mock.Mock(StartColumn=c, StartRow=r, EndColumn=c,
+                              EndRow=r))
+        ranges = [mock.Mock(NumberFormat=format_id, RangeAddresses=addresses)
+                  for format_id, addresses in addresses_by_format.items()]
+        return mock.Mock(Count=len(ranges), getByIndex=ranges.__getitem__)
 
 
 class LOHelperTestCase(unittest.TestCase):
@@ -21,6 +73,163 @@ class LOHelperTestCase(unittest.TestCase):
             log_path = None
         init_logger(logging.getLogger(), log_path)
 
+    def test_guess_format_ids(self):
+        values = [
+            ("a", 1.0, "", 3.0),
+            ("b", 2.0, "", "x"),
+            ("c", "", "", 5.0),
+        ]
+        format_ids = [
+            (0, 10, 0, 0),
+            (0, 10, 0, 20),
+            (0, 10, 0, 0),
+        ]
+        self.assertEqual([-1, 10, 0, 0],
+                         guess_format_ids(values, format_ids))
+
+    def test_guess_format_ids_dominant(self):
+        values = [(1.0,), (2.0,), (3.0,), ("",)]
+        format_ids = [(30,), (20,), (30,), (40,)]
+        self.assertEqual([30], guess_format_ids(values, format_ids))
+
+    def test_guess_format_ids_empty(self):
+        self.assertEqual([], guess_format_ids([], []))
+
+    def test_guess_formats(self):
+        values = [("a", 1.0, 1.0), ("b", 2.0, 2.0), (3.0, 3.0, "")]
+        format_ids = [(0, 10, 10), (0, 10, 20), (0, 10, 20)]
+        self.assertEqual([(-1, 2 / 3), (10, 1.0), (20, 0.5)],
+                         guess_formats(values, format_ids))
+
+    def test_sample_windows(self):
+        self.assertEqual([], sample_windows(0))
+        self.assertEqual([(0, 10)], sample_windows(10, 100))
+        self.assertEqual([(0, 20), (245, 265), (490, 510), (735, 755),
+                          (980, 1000)], sample_windows(1000, 100))
+        windows = sample_windows(1048576)
+        self.assertEqual(1000, sum(end - start for start, end in windows))
+        self.assertEqual(1048576, windows[-1][1])
+
+    def test_guess_format_ids_pure_python(self):
+        values = [("a", 1.0), ("b", 2.0)]
+        format_ids = [(0, 10), (0, 20)]
+        with mock.patch.object(lo_helper, "np", None):
+            self.assertEqual([-1, 20], guess_format_ids(values, format_ids))
+
+    @unittest.skipIf(lo_helper.np is None, "NumPy is missing")
+    def test_guess_format_ids_numpy_matches_pure_python(self):
+        rnd = random.Random(17)
+        values = [tuple(rnd.choice(("", "t", 0.0, 1.5)) for _ in range(30))
+                  for _ in range(300)]
+        format_ids = [tuple(rnd.choice((0, 0, 10, 20)) for _ in range(30))
+                      for _ in range(300)]
+        # uniform formats on columns 1 to 4
+        format_ids = [row[:1] + (36,) * 4 + row[5:] for row in format_ids]
+
+        with mock.patch.object(lo_helper, "np", None):
+            expected = guess_formats(values, format_ids)
+        actual = guess_formats(values, format_ids)
+        self.assertEqual([f for f, _ in expected], [f for f, _ in actual])
+        for (_, e), (_, a) in zip(expected, actual):
+            self.assertAlmostEqual(e, a)
+
+    def _sample(self):
+        # a used range C5:E24, whose column D changes its format at row 15
+        cells = {}
+        for r in range(4, 24):
+            cells[2, r] = (float(r), 10)
+            cells[3, r] = (float(r), 20 if r < 14 else 30)
+            cells[4, r] = ("t{}".format(r), 0)
+        oRange = FakeCellRange(cells, 2, 4, 4, 23)
+        return fetch_sample(oRange, [(0, 2), (9, 11), (18, 20)])
+
+    def test_fetch_sample(self):
+        sample = self._sample()
+        self.assertEqual([(4.0, 4.0, "t4"), (5.0, 5.0, "t5"),
+                          (13.0, 13.0, "t13"), (14.0, 14.0, "t14"),
+                          (22.0, 22.0, "t22"), (23.0, 23.0, "t23")],
+                         [tuple(row) for row in sample.values])
+        self.assertEqual([[10, 20, 0], [10, 20, 0], [10, 20, 0],
+                          [10, 30, 0], [10, 30, 0], [10, 30, 0]],
+                         [list(row) for row in sample.format_ids])
+        self.assertEqual([10, 30, -1], guess_format_ids(sample.values,
+                                                        sample.format_ids))
+
+    def test_fetch_sample_pure_python(self):
+        with mock.patch.object(lo_helper, "np", None):
+            sample = self._sample()
+        self.assertEqual([[10, 20, 0], [10, 20, 0], [10, 20, 0],
+                          [10, 30, 0], [10, 30, 0], [10, 30, 0]],
+                         sample.format_ids)
+
+    def test_coalesce_cells(self):
+        cells = [(0, 0), (0, 1), (1, 0), (1, 1), (3, 4), (1, 3), (0, 1)]
+        self.assertEqual([(0, 0, 1, 1), (1, 3, 1, 3), (3, 4, 3, 4)],
+                         coalesce_cells(cells))
+        self.assertEqual([], coalesce_cells([]))
+
+    def test_coalesce_cells_gap(self):
+        cells = [(0, 0), (0, 1), (2, 0), (2, 1), (1, 0)]
+        self.assertEqual([(0, 0, 0, 1), (1, 0, 1, 0), (2, 0, 2, 1)],
+                         coalesce_cells(cells))
+
+    def test_column_name(self):
+        self.assertEqual(["A", "Z", "AA", "AZ", "BA", "ZZ", "AAA"],
+                         [column_name(c)
+                          for c in (0, 25, 26, 51, 52, 701, 702)])
+
+    def test_format_range_addresses(self):
+        self.assertEqual(
+            "Sheet1.A1:B2;Sheet1.D5",
+            format_range_addresses("Sheet1",
+                                   [(0, 0, 1, 1), (3, 4, 3, 4)]))
+        self.assertEqual("'My sheet'.C3",
+                         format_range_addresses("My sheet", [(2, 2, 2, 2)]))
+        self.assertEqual("'It''s'.A1",
+                         format_range_addresses("It's", [(0, 0, 0, 0)]))
+        self.assertEqual("'2023'.A1",
+                         format_range_addresses("2023", [(0, 0, 0, 0)]))
+
+    def test_format_type_cache(self):
+        oFormats = mock.Mock()
+        oFormats.getByKey.side_effect = lambda k: mock.Mock(Type=k + 1)
+        cache = FormatTypeCache(oFormats, 2)
+
+        self.assertEqual([256, 10, 10, 20],
+                         cache.get_type_ids([-1, 10, 10, 20]))
+        self.assertEqual(2, oFormats.getByKey.call_count)
+        self.assertEqual((0, 3), (cache.hits, cache.misses))
+
+        # -1 was evicted
+        self.assertEqual(256, cache.get_type_id(-1))
+        self.assertEqual(20, cache.get_type_id(20))
+        self.assertEqual((1, 4), (cache.hits, cache.misses))
+
+    def test_shorten(self):
+        self.assertEqual("abc", shorten("abc", 5))
+        self.assertEqual("ab...", shorten("abcde", 5))
+        self.assertEqual("ab...", shorten("abcdefgh", 5))
+
+    def test_get_text_prefix(self):
+        text = "first\nsecond"
+
+        class FakeCursor:
+            String = ""
+            position = 3
+
+            def gotoStart(self, _expand):
+                self.position = 0
+
+            def gotoStartOfParagraph(self, _expand):
+                self.position = 0
+
+            def goRight(self, count, _expand):
+                self.String = text[self.position:self.position + count]
+
+        self.assertEqual("first\nse", get_text_prefix(FakeCursor(), 8))
+        self.assertEqual("first", get_text_prefix(FakeCursor(), 8, True))
+        self.assertEqual("fir", get_text_prefix(FakeCursor(), 3, True))
+
 
 if __name__ == '__main__':
     unittest.main()